@@ -27,7 +27,10 @@ setuptools.setup(
     python_requires=">=3.9",
     include_package_data=True,
     package_data={
-        "EmojiCloud": ["data/*/*.png"]
+        "EmojiCloud": ["data/*/*.png", "data/*.atlas.*", "data/manifest.json", "benchmark_baseline.json"]
+    },
+    entry_points={
+        "console_scripts": ["emojicloud-batch = EmojiCloud.batch:main"]
     }
 )
 
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import uuid
+import threading
+from dataclasses import dataclass
+import numpy as np
+from PIL import Image
+
+from .config import data_dir
+
+ATLAS_VERSION = 2
+
+
+@dataclass(frozen=True)
+class AtlasEntry:
+    """the location and summary of an emoji image in an atlas"""
+    # the offset of the first byte of the image in the atlas data
+    offset: int
+    width: int
+    height: int
+    # the bounding box (x0, y0, x1, y1) of the opaque pixels, with exclusive ends
+    bbox: tuple[int, int, int, int]
+    # the count of opaque pixels
+    count_opaque: int
+
+
+class Atlas():
+    """the emoji images of a vendor packed into a single memory-mapped file
+
+    The data file is a 1D uint8 `.npy` array of the RGBA images one after another, each stored row by row,
+    and the index file maps each unicode to its `AtlasEntry`. Images are read from the mapped pages without copying,
+    so the pages are shared between processes.
+
+    Each build writes a data file of its own name, which the index refers to along with its size, so replacing the
+    index publishes a new build at once and an index is never read with the data of another build.
+    """
+
+    def __init__(self, path_index: str):
+        """
+        Args:
+            path_index (str): the path of the atlas index file, next to the data file it refers to
+
+        Raises:
+            ValueError: if the index is of another version or does not match its data file
+        """
+        with open(path_index, encoding='utf-8') as f:
+            index = json.load(f)
+        if (index.get('version') != ATLAS_VERSION):
+            raise ValueError("unsupported atlas version: %s" % index.get('version'))
+        self.vendor = index['vendor']
+        self.dict_entry = {
+            unicode: AtlasEntry(offset, width, height, tuple(bbox), count_opaque)
+            for unicode, (offset, width, height, bbox, count_opaque) in index['emojis'].items()
+        }
+        self.path_data = os.path.join(os.path.dirname(path_index), index['data'])
+        self.data = np.load(self.path_data, mmap_mode='r')
+        if (len(self.data) != index['size']):
+            raise ValueError("the atlas data %s has %d bytes instead of %d" % (self.path_data, len(self.data), index['size']))
+
+    def __len__(self):
+        return len(self.dict_entry)
+
+    def __contains__(self, unicode):
+        return unicode in self.dict_entry
+
+    @property
+    def unicodes(self) -> list[str]:
+        return list(self.dict_entry.keys())
+
+    def get_entry(self, unicode: str) -> AtlasEntry:
+        return self.dict_entry[unicode]
+
+    def get_array(self, unicode: str) -> np.ndarray:
+        """get the read-only RGBA array of shape (height, width, 4) of an emoji, backed by the mapped file
+
+        Args:
+            unicode (str): unicode of the emoji
+
+        Returns:
+            np.ndarray: the RGBA array
+        """
+        entry = self.dict_entry[unicode]
+        size = entry.width * entry.height * 4
+        return self.data[entry.offset:entry.offset + size].reshape(entry.height, entry.width, 4)
+
+    def get_image(self, unicode: str) -> Image.Image:
+        """get the RGBA image of an emoji, sharing memory with the mapped file
+
+        Args:
+            unicode (str): unicode of the emoji
+
+        Returns:
+            Image.Image: the RGBA image
+        """
+        return Image.fromarray(self.get_array(unicode), 'RGBA')
+
+
+def get_atlas_path(vendor: str, atlas_dir: str = None) -> str:
+    """get the path of the atlas index file of a vendor
+
+    Args:
+        vendor (str): the vendor, e.g. 'Twtr'
+        atlas_dir (str, optional): the directory of the atlas files. Defaults to the data directory.
+
+    Returns:
+        str: the path of the index file, the data files are named after it with the id of their build
+    """
+    if (atlas_dir is None):
+        atlas_dir = data_dir
+    return os.path.join(atlas_dir, "%s.atlas.json" % vendor)
+
+
+def build_atlas(vendor: str, vendor_dir: str = None, atlas_dir: str = None) -> Atlas:
+    """pack the emoji images of a vendor into an atlas
+
+    Args:
+        vendor (str): the vendor, e.g. 'Twtr'
+        vendor_dir (str, optional): the directory of the vendor's PNG images. Defaults to the vendor's data directory.
+        atlas_dir (str, optional): the directory of the atlas files. Defaults to the data directory.
+
+    Returns:
+        Atlas: the built atlas
+    """
+    if (vendor_dir is None):
+        vendor_dir = os.path.join(data_dir, vendor)
+    if (atlas_dir is None):
+        atlas_dir = data_dir
+    path_index = get_atlas_path(vendor, atlas_dir)
+    list_name = sorted(name for name in os.listdir(vendor_dir) if name.endswith('.png'))
+
+    # the data file of this build, published by replacing the index
+    name_data = "%s.atlas.%s.npy" % (vendor, uuid.uuid4().hex)
+    path_data = os.path.join(atlas_dir, name_data)
+    path_index_tmp = path_index + ".tmp"
+    try:
+        # read image sizes from the PNG headers to lay out the atlas
+        list_size = []
+        for name in list_name:
+            with Image.open(os.path.join(vendor_dir, name)) as im:
+                list_size.append(im.size)
+        list_offset = np.cumsum([0] + [width * height * 4 for (width, height) in list_size])
+
+        data = np.lib.format.open_memmap(path_data, mode='w+', dtype=np.uint8, shape=(int(list_offset[-1]),))
+        dict_emoji = {}
+        for name, (width, height), offset in zip(list_name, list_size, list_offset):
+            with Image.open(os.path.join(vendor_dir, name)) as im:
+                im_array = np.asarray(im.convert('RGBA'))
+            data[offset:offset + im_array.size] = im_array.reshape(-1)
+            list_y, list_x = np.nonzero(im_array[:, :, 3])
+            if (len(list_x) > 0):
+                bbox = [int(list_x.min()), int(list_y.min()), int(list_x.max()) + 1, int(list_y.max()) + 1]
+            else:
+                bbox = [0, 0, 0, 0]
+            dict_emoji[name[:-len('.png')]] = [int(offset), width, height, bbox, len(list_x)]
+        data.flush()
+        del data
+        with open(path_index_tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': ATLAS_VERSION, 'vendor': vendor, 'data': name_data, 'size': int(list_offset[-1]), 'emojis': dict_emoji
+            }, f)
+        os.replace(path_index_tmp, path_index)
+    except BaseException:
+        for path in (path_data, path_index_tmp):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+
+    # the data files of the previous builds, kept if still mapped where files in use cannot be removed
+    prefix = "%s.atlas." % vendor
+    for name in os.listdir(atlas_dir):
+        if (name.startswith(prefix) and name.endswith('.npy') and name != name_data):
+            try:
+                os.remove(os.path.join(atlas_dir, name))
+            except OSError:
+                pass
+
+    with _atlas_lock:
+        _dict_atlas.pop((vendor, atlas_dir), None)
+    return Atlas(path_index)
+
+
+# key: (vendor, atlas_dir), value: the loaded Atlas, or None if not built
+_dict_atlas = {}
+_atlas_lock = threading.Lock()
+
+
+def load_atlas(vendor: str, atlas_dir: str = None) -> Atlas:
+    """load the atlas of a vendor once per process
+
+    Args:
+        vendor (str): the vendor, e.g. 'Twtr'
+        atlas_dir (str, optional): the directory of the atlas files. Defaults to the data directory.
+
+    Returns:
+        Atlas: the atlas, None if the vendor's atlas has not been built or cannot be read, so the PNG files are read instead
+    """
+    if (atlas_dir is None):
+        atlas_dir = data_dir
+    key = (vendor, atlas_dir)
+    with _atlas_lock:
+        if (key not in _dict_atlas):
+            path_index = get_atlas_path(vendor, atlas_dir)
+            try:
+                _dict_atlas[key] = Atlas(path_index)
+            except (OSError, ValueError, KeyError):
+                _dict_atlas[key] = None
+        return _dict_atlas[key]
+
+
+def main():
+    """build the atlases of the given vendors, or of all vendors in the data directory"""
+    list_vendor = sys.argv[1:] or sorted(
+        name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+    for vendor in list_vendor:
+        atlas = build_atlas(vendor)
+        print("%s: %d emojis" % (vendor, len(atlas)))
+
+
+if __name__ == '__main__':
+    main()
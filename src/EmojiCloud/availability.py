@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import threading
+
+from .config import data_dir
+
+MANIFEST_NAME = "manifest.json"
+
+
+class VendorIndex():
+    """a lazily built index of the unicodes available for each vendor
+
+    The unicodes of a vendor are read once from the manifest `data/manifest.json` if the vendor is listed there, otherwise from
+    one scan of the vendor's directory together with the vendor's atlas if built, so existence checks need no file system access.
+    """
+
+    def __init__(self, data_dir: str = data_dir, atlas_dir: str = None):
+        """
+        Args:
+            data_dir (str, optional): the directory of the vendor directories and the manifest. Defaults to the package data directory.
+            atlas_dir (str, optional): the directory of the atlas files. Defaults to the package data directory.
+        """
+        self.data_dir = data_dir
+        self.atlas_dir = atlas_dir
+        self._lock = threading.Lock()
+        self._manifest = None  # key: vendor, value: list of unicodes, {} if not shipped
+        self._dict_unicode = {}  # key: vendor, value: frozenset of unicodes
+
+    def get_unicodes(self, vendor: str) -> frozenset[str]:
+        """get the unicodes available for a vendor
+
+        Args:
+            vendor (str): the vendor, e.g. 'Twtr'
+
+        Returns:
+            frozenset[str]: the unicodes, empty if the vendor does not exist
+        """
+        set_unicode = self._dict_unicode.get(vendor)
+        if (set_unicode is None):
+            with self._lock:
+                if (vendor not in self._dict_unicode):
+                    self._dict_unicode[vendor] = self._scan_vendor(vendor)
+                set_unicode = self._dict_unicode[vendor]
+        return set_unicode
+
+    def exists(self, unicode: str, vendor: str) -> bool:
+        """check if an emoji with a given unicode and vendor exists
+
+        Args:
+            unicode (str): unicode of the emoji
+            vendor (str): vendor of the emoji
+        """
+        return unicode in self.get_unicodes(vendor)
+
+    def filter_exist(self, unicodes, vendor: str) -> list[str]:
+        """find which of the given unicodes exist for a vendor
+
+        Args:
+            unicodes (iterable of str): unicodes of the emojis
+            vendor (str): vendor of the emojis
+
+        Returns:
+            list[str]: the existing unicodes in the given order
+        """
+        set_unicode = self.get_unicodes(vendor)
+        return [u for u in unicodes if u in set_unicode]
+
+    def invalidate(self, vendor: str = None):
+        """forget the indexed unicodes so that they are read again on the next query
+
+        Args:
+            vendor (str, optional): the vendor to forget. Defaults to None, all vendors and the manifest.
+        """
+        with self._lock:
+            if (vendor is None):
+                self._dict_unicode.clear()
+                self._manifest = None
+            else:
+                self._dict_unicode.pop(vendor, None)
+
+    def _scan_vendor(self, vendor: str) -> frozenset[str]:
+        if (self._manifest is None):
+            path_manifest = os.path.join(self.data_dir, MANIFEST_NAME)
+            if (os.path.exists(path_manifest)):
+                with open(path_manifest, encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            else:
+                self._manifest = {}
+        if (vendor in self._manifest):
+            return frozenset(self._manifest[vendor])
+
+        set_unicode = set()
+        try:
+            with os.scandir(os.path.join(self.data_dir, vendor)) as it:
+                for entry in it:
+                    if (entry.name.endswith('.png')):
+                        set_unicode.add(entry.name[:-len('.png')])
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        # imported on first scan, the atlas imports NumPy
+        from .atlas import load_atlas
+        atlas = load_atlas(vendor, self.atlas_dir)
+        if (atlas is not None):
+            set_unicode.update(atlas.unicodes)
+        return frozenset(set_unicode)
+
+
+def write_manifest(data_dir: str = data_dir, list_vendor: list[str] = None) -> dict[str, list[str]]:
+    """scan the vendor directories and write the manifest of the available unicodes
+
+    Args:
+        data_dir (str, optional): the directory of the vendor directories. Defaults to the package data directory.
+        list_vendor (list[str], optional): the vendors to include. Defaults to all directories in `data_dir`.
+
+    Returns:
+        dict[str, list[str]]: key: vendor, value: sorted list of unicodes
+    """
+    if (list_vendor is None):
+        list_vendor = sorted(name for name in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, name)))
+    # scan without reading a previously written manifest
+    index = VendorIndex(data_dir, atlas_dir=data_dir)
+    index._manifest = {}
+    manifest = {vendor: sorted(index.get_unicodes(vendor)) for vendor in list_vendor}
+    path_manifest = os.path.join(data_dir, MANIFEST_NAME)
+    with open(path_manifest + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(path_manifest + ".tmp", path_manifest)
+    return manifest
+
+
+# the process-wide index used by `EmojiItem` and `EmojiManager`
+vendor_index = VendorIndex()
+
+
+def main():
+    """write the manifest of the given vendors, or of all vendors in the data directory"""
+    manifest = write_manifest(list_vendor=sys.argv[1:] or None)
+    for vendor, list_unicode in manifest.items():
+        print("%s: %d emojis" % (vendor, len(list_unicode)))
+
+
+if __name__ == '__main__':
+    main()
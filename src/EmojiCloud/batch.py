@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field, asdict
+from timeit import default_timer as timer
+
+from .emoji import EmojiItem, EmojiManager
+from .canvas import CanvasBase, RectangleCanvas, EllipseCanvas, MaskedCanvas
+from .plot import plot_dense_emoji_cloud
+
+
+@dataclass(frozen=True)
+class CanvasSpec:
+    """the parameters of a canvas, for creating it in a worker process and reusing it across jobs"""
+    # 'rectangle', 'ellipse' or 'masked'
+    shape: str = 'ellipse'
+    # the canvas size of rectangle and ellipse canvases, masked canvases take the size of the mask image
+    width: int = 72 * 10
+    height: int = 72 * 10
+    color: str = 'white'
+    # the path of the mask image of masked canvases
+    mask: str = None
+    contour_width: int = 5
+    contour_color: tuple = (0, 172, 238, 255)
+    thold_alpha_contour: int = 10
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'CanvasSpec':
+        d = dict(d)
+        if ('contour_color' in d):
+            d['contour_color'] = tuple(d['contour_color'])
+        return cls(**d)
+
+    def create(self) -> CanvasBase:
+        """create the canvas
+
+        Returns:
+            CanvasBase: the canvas
+        """
+        if (self.shape == 'rectangle'):
+            return RectangleCanvas(self.width, self.height, self.color)
+        if (self.shape == 'ellipse'):
+            return EllipseCanvas(self.width, self.height, self.color)
+        if (self.shape == 'masked'):
+            if (self.mask is None):
+                raise ValueError("a masked canvas needs a mask image")
+            return MaskedCanvas(self.mask, self.contour_width, self.contour_color, self.thold_alpha_contour)
+        raise ValueError("unknown canvas shape: %s" % self.shape)
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    """an emoji cloud to plot and save"""
+    # key: emoji unicode, value: weight
+    weights: dict
+    vendor: str
+    canvas: CanvasSpec
+    # the path of the image file to save the emoji cloud to, None if the image is not saved
+    output: str = None
+    # an identifier reported back with the result, defaults to the output path
+    id: str = None
+    # keyword arguments of `plot_dense_emoji_cloud`, e.g. "placement" or "num_try"
+    options: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'RenderJob':
+        """create a job from a dictionary of JSON types, such as a line of a JSONL job file
+
+        Args:
+            d (dict): "weights", "vendor", "canvas" (a dictionary of the fields of `CanvasSpec`),
+                and optionally "output", "id" and "options"
+
+        Returns:
+            RenderJob: the job
+        """
+        return cls(
+            weights=d['weights'],
+            vendor=d['vendor'],
+            canvas=CanvasSpec.from_dict(d.get('canvas', {})),
+            output=d.get('output'),
+            id=d.get('id'),
+            options=d.get('options', {})
+        )
+
+
+@dataclass(frozen=True)
+class RenderResult:
+    """the outcome of a job"""
+    id: str
+    output: str
+    # whether the emoji cloud was saved
+    success: bool
+    # the count of existing emojis plotted
+    count: int = 0
+    # the seconds spent on the job in the worker
+    duration: float = 0.0
+    # the error message of a failed job
+    error: str = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobError(ValueError):
+    """a job that cannot be plotted, such as one without any existing emoji"""
+
+
+# the count of canvases kept per process
+MAX_CANVASES = 8
+
+# the recently used canvases of the current process, reused across jobs.
+# key: CanvasSpec, with the modification time and size of the mask file for masked canvases, value: CanvasBase
+_dict_canvas = OrderedDict()
+
+
+def get_canvas(spec: CanvasSpec, max_canvases: int = MAX_CANVASES) -> CanvasBase:
+    """get the canvas of a spec, reused across the jobs of a process
+
+    Plotting does not modify the canvas, so the canvas and its sorted pixels are shared by the jobs of a process.
+    The least recently used canvases are dropped beyond `max_canvases`, and a masked canvas is created again
+    once its mask file changes.
+
+    Args:
+        spec (CanvasSpec): the canvas parameters
+        max_canvases (int, optional): the maximum count of canvases kept, 0 to keep none. Defaults to MAX_CANVASES.
+
+    Returns:
+        CanvasBase: the canvas
+    """
+    key = spec
+    if (spec.shape == 'masked' and spec.mask is not None):
+        stat = os.stat(spec.mask)
+        key = (spec, stat.st_mtime_ns, stat.st_size)
+    canvas = _dict_canvas.get(key)
+    if (canvas is None):
+        canvas = spec.create()
+        if (max_canvases <= 0):
+            return canvas
+        _dict_canvas[key] = canvas
+    _dict_canvas.move_to_end(key)
+    while (len(_dict_canvas) > max_canvases):
+        _dict_canvas.popitem(last=False)
+    return canvas
+
+
+def create_job_emoji_list(job: RenderJob) -> list[EmojiItem]:
+    """create the existing emojis of a job
+
+    Args:
+        job (RenderJob): the job
+
+    Returns:
+        list[EmojiItem]: the emojis of the job's weights that exist for its vendor
+    """
+    return EmojiManager.create_list_from_single_vendor(job.weights, job.vendor)
+
+
+def plot_job(job: RenderJob):
+    """plot the emoji cloud of a job in the current process
+
+    Args:
+        job (RenderJob): the job
+
+    Raises:
+        JobError: if no emoji of the job exists or the emojis do not fit the canvas
+
+    Returns:
+        (im, count): the emoji cloud and the count of existing emojis plotted
+    """
+    emoji_list = create_job_emoji_list(job)
+    if (len(emoji_list) == 0):
+        raise JobError("no existing emoji")
+    im = plot_dense_emoji_cloud(get_canvas(job.canvas), emoji_list, **job.options)
+    if (im is None):
+        raise JobError("the emojis do not fit the canvas")
+    return im, len(emoji_list)
+
+
+def render_job(job: RenderJob) -> RenderResult:
+    """plot and save the emoji cloud of a job in the current process
+
+    Args:
+        job (RenderJob): the job, only plotted if its output is None
+
+    Returns:
+        RenderResult: the result, with the error message instead of raising if the job fails
+    """
+    job_id = job.id if job.id is not None else job.output
+    start = timer()
+    try:
+        im, count = plot_job(job)
+        if (job.output is not None):
+            im.save(job.output)
+    except JobError as e:
+        return RenderResult(job_id, job.output, False, duration=timer() - start, error=str(e))
+    except Exception as e:
+        return RenderResult(job_id, job.output, False, duration=timer() - start, error="%s: %s" % (type(e).__name__, e))
+    return RenderResult(job_id, job.output, True, count, timer() - start)
+
+
+def _init_batch_worker(list_vendor: list[str]):
+    # index the vendors once per worker rather than on the first job of each vendor
+    for vendor in list_vendor:
+        EmojiManager.filter_exist_unicodes([], vendor)
+
+
+def render_batch(jobs, num_worker: int = None, list_vendor: list[str] = (), max_pending: int = None):
+    """plot and save the emoji clouds of many jobs on a process pool, yielding the results as the jobs finish
+
+    The worker processes are started once for the whole batch, and keep their vendor indexes, canvases and sprite cache
+    across jobs. Jobs are read from `jobs` only as workers free up, so a long stream of jobs is never held in memory at once.
+
+    Args:
+        jobs (iterable of RenderJob): the jobs, failed RenderResult objects of `read_jobs` among them are yielded as they are
+        num_worker (int, optional): the number of worker processes, 0 to render in the current process. Defaults to the number of CPUs.
+        list_vendor (list[str], optional): the vendors to index in each worker before the first job. Defaults to none.
+        max_pending (int, optional): the maximum count of submitted jobs not finished yet. Defaults to twice the number of workers.
+
+    Yields:
+        RenderResult: the result of each job, in the order of finishing
+    """
+    if (num_worker == 0):
+        _init_batch_worker(list_vendor)
+        for job in jobs:
+            yield job if isinstance(job, RenderResult) else render_job(job)
+        return
+
+    if (num_worker is None):
+        num_worker = os.cpu_count() or 1
+    if (max_pending is None):
+        max_pending = num_worker * 2
+    ctx = multiprocessing.get_context()
+    with ProcessPoolExecutor(max_workers=num_worker, mp_context=ctx, initializer=_init_batch_worker,
+                             initargs=(tuple(list_vendor),)) as executor:
+        pending = set()
+        for job in jobs:
+            if (isinstance(job, RenderResult)):
+                yield job
+                continue
+            if (len(pending) >= max_pending):
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(render_job, job))
+        while (pending):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def read_jobs(f):
+    """read jobs from a JSONL file lazily, skipping empty lines
+
+    Args:
+        f: a text file of one JSON object of `RenderJob.from_dict` per line
+
+    Yields:
+        RenderJob: the job of each line, or a failed RenderResult with the id "line <number>" of a malformed line
+    """
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if (not line):
+            continue
+        try:
+            yield RenderJob.from_dict(json.loads(line))
+        except (ValueError, KeyError, TypeError) as e:
+            # a malformed line fails alone rather than the whole batch
+            yield RenderResult("line %d" % line_number, None, False, error="%s: %s" % (type(e).__name__, e))
+
+
+def main(argv: list[str] = None) -> int:
+    """render the jobs of a JSONL file from the command line, writing one JSON result per line as jobs finish
+
+    Returns:
+        int: the exit code, 1 if any job fails
+    """
+    parser = argparse.ArgumentParser(
+        prog='emojicloud-batch', description="plot the emoji clouds of a JSONL file of jobs on a process pool")
+    parser.add_argument('jobs', help="the JSONL file of jobs, - for standard input")
+    parser.add_argument('--output', help="the JSONL file to write the results to, default: standard output")
+    parser.add_argument('--workers', type=int, help="the number of worker processes, 0 for none, default: the number of CPUs")
+    parser.add_argument('--vendor', nargs='+', default=[], help="the vendors to index in each worker before the first job")
+    args = parser.parse_args(argv)
+
+    f_jobs = sys.stdin if args.jobs == '-' else open(args.jobs, encoding='utf-8')
+    f_results = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8')
+    count_failed = 0
+    try:
+        for result in render_batch(read_jobs(f_jobs), args.workers, args.vendor):
+            count_failed += not result.success
+            f_results.write(json.dumps(result.to_dict()) + "\n")
+            f_results.flush()
+    finally:
+        if (f_jobs is not sys.stdin):
+            f_jobs.close()
+        if (f_results is not sys.stdout):
+            f_results.close()
+    return 1 if count_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
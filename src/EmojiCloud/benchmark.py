@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import platform
+import tempfile
+from timeit import default_timer as timer
+from PIL import Image, ImageDraw
+
+from .emoji import EmojiItem
+from .canvas import RectangleCanvas, EllipseCanvas, MaskedCanvas
+from .plot import plot_dense_emoji_cloud
+from .cache import sprite_cache
+from .metrics import collect_metrics
+
+SYNTHETIC_VENDOR = 'Synthetic'
+
+# the stored results of the quick matrix to compare with by default, written by `--output` of the command line
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+QUICK_MATRIX = {
+    "canvas": ["rectangle", "ellipse", "masked"],
+    "size": [200],
+    "count": [20, 100]
+}
+
+FULL_MATRIX = {
+    "canvas": ["rectangle", "ellipse", "masked"],
+    "size": [200, 480, 720],
+    "count": [20, 100, 500, 2000]
+}
+
+
+def make_star_points(center_x: float, center_y: float, radius_outer: float, radius_inner: float, num_point: int = 5) -> list[tuple[float, float]]:
+    """calculate the vertices of a star
+
+    Args:
+        center_x (float): the center x of the star
+        center_y (float): the center y of the star
+        radius_outer (float): the radius of the points
+        radius_inner (float): the radius of the notches between the points
+        num_point (int, optional): the count of points. Defaults to 5.
+
+    Returns:
+        list[tuple[float, float]]: the vertices (x, y) in order
+    """
+    list_point = []
+    for i in range(num_point * 2):
+        radius = radius_outer if i % 2 == 0 else radius_inner
+        angle = math.pi * i / num_point - math.pi / 2
+        list_point.append((center_x + radius * math.cos(angle), center_y + radius * math.sin(angle)))
+    return list_point
+
+
+def make_synthetic_sprite(seed: int, size: int = 72) -> Image.Image:
+    """draw a synthetic emoji image, a circle, a star or a glyph-like shape, with faint pixels around it
+
+    Args:
+        seed (int): the seed of the shape and colors, the same seed gives the same image
+        size (int, optional): the width and height of the image. Defaults to 72, the size of the vendor images.
+
+    Returns:
+        Image.Image: the RGBA image
+    """
+    rnd = random.Random(seed)
+    im = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+    color = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256), 255)
+    kind = seed % 3
+    if (kind == 0):
+        # a circle
+        margin = rnd.randrange(1, size // 6)
+        draw.ellipse([margin, margin, size - 1 - margin, size - 1 - margin], fill=color)
+    elif (kind == 1):
+        # a star
+        draw.polygon(make_star_points(size / 2, size / 2, size / 2 - 1, size * rnd.uniform(0.18, 0.3)), fill=color)
+    else:
+        # a glyph of a few strokes
+        for i in range(rnd.randrange(2, 5)):
+            x_1, y_1 = rnd.randrange(size), rnd.randrange(size)
+            x_2, y_2 = rnd.randrange(size), rnd.randrange(size)
+            draw.line([x_1, y_1, x_2, y_2], fill=color, width=rnd.randrange(size // 12, size // 6))
+    # faint pixels outside the shape, as anti-aliased vendor images have
+    for i in range(size // 2):
+        x, y = rnd.randrange(size), rnd.randrange(size)
+        if (im.getpixel((x, y))[3] == 0):
+            im.putpixel((x, y), (0, 0, 0, rnd.randrange(1, 8)))
+    return im
+
+
+def make_synthetic_emoji_list(count: int, seed: int = 0) -> list[EmojiItem]:
+    """create emoji items of synthetic images with random weights
+
+    Args:
+        count (int): the count of emojis
+        seed (int, optional): the seed of the images and weights. Defaults to 0.
+
+    Returns:
+        list[EmojiItem]: the emoji items, cached in the sprite cache like the vendor images
+    """
+    rnd = random.Random(seed)
+    emoji_list = []
+    for i in range(count):
+        emoji_list.append(EmojiItem.from_image(
+            'U+%X' % (0xF0000 + i), rnd.uniform(1, 5), SYNTHETIC_VENDOR, make_synthetic_sprite(seed * 100003 + i), vendor_image=True))
+    return emoji_list
+
+
+def make_canvas(canvas: str, size: int, mask_dir: str):
+    """create a canvas of the given kind
+
+    Args:
+        canvas (str): 'rectangle', 'ellipse' or 'masked'
+        size (int): the width and height of the canvas
+        mask_dir (str): the directory to write the mask image of a masked canvas to
+
+    Returns:
+        CanvasBase: the canvas
+    """
+    if (canvas == 'rectangle'):
+        return RectangleCanvas(size, size)
+    if (canvas == 'ellipse'):
+        return EllipseCanvas(size, size)
+    if (canvas == 'masked'):
+        # a star mask within the canvas after adding the contour
+        contour_width = 5
+        size_mask = size - contour_width * 2
+        path_mask = os.path.join(mask_dir, 'mask_%d.png' % size_mask)
+        if (not os.path.exists(path_mask)):
+            im = Image.new('RGBA', (size_mask, size_mask), (0, 0, 0, 0))
+            ImageDraw.Draw(im).polygon(
+                make_star_points(size_mask / 2, size_mask / 2, size_mask / 2 - 1, size_mask / 4), fill=(255, 200, 0, 255))
+            im.save(path_mask)
+        return MaskedCanvas(path_mask, contour_width, (0, 172, 238, 255))
+    raise ValueError("unknown canvas: %s" % canvas)
+
+
+def run_case(canvas: str, size: int, count: int, mask_dir: str, placement: str = 'scan', search: str = 'linear', track_memory: bool = True) -> dict:
+    """plot a synthetic emoji cloud and measure it
+
+    Args:
+        canvas (str): 'rectangle', 'ellipse' or 'masked'
+        size (int): the width and height of the canvas
+        count (int): the count of emojis
+        mask_dir (str): the directory of the mask images of masked canvases
+        placement (str, optional): the placement mode of `plot_dense_emoji_cloud`. Defaults to 'scan'.
+        search (str, optional): the search strategy of `plot_dense_emoji_cloud`. Defaults to 'linear'.
+        track_memory (bool, optional): whether to plot again to record the peak memory. Defaults to True.
+
+    Returns:
+        dict: the case, "wall" seconds, "canvas_time" seconds, "success", the "spans" and "counters" of the metrics,
+            and "peak_memory" bytes (None if not tracked)
+    """
+    emoji_list = make_synthetic_emoji_list(count)
+    start = timer()
+    canvas_obj = make_canvas(canvas, size, mask_dir)
+    canvas_time = timer() - start
+
+    sprite_cache.clear()
+    start = timer()
+    with collect_metrics() as metrics:
+        im = plot_dense_emoji_cloud(canvas_obj, emoji_list, placement=placement, search=search)
+    wall = timer() - start
+    summary = metrics.summary()
+
+    peak_memory = None
+    if (track_memory):
+        # tracing slows plotting down, so the memory is measured separately from the time
+        sprite_cache.clear()
+        canvas_obj = make_canvas(canvas, size, mask_dir)
+        with collect_metrics(track_memory=True) as metrics_memory:
+            plot_dense_emoji_cloud(canvas_obj, emoji_list, placement=placement, search=search)
+        peak_memory = metrics_memory.summary()["spans"]["plot"]["peak_memory"]
+    sprite_cache.clear()
+
+    return {
+        "canvas": canvas,
+        "size": size,
+        "count": count,
+        "placement": placement,
+        "search": search,
+        "success": im is not None,
+        "wall": wall,
+        "canvas_time": canvas_time,
+        "spans": {name: stats["total"] for name, stats in summary["spans"].items()},
+        "counters": summary["counters"],
+        "peak_memory": peak_memory
+    }
+
+
+def run_benchmark(matrix: dict = QUICK_MATRIX, placement: str = 'scan', search: str = 'linear', track_memory: bool = True, repeat: int = 1, log=None) -> dict:
+    """run all cases of a matrix of canvases, sizes and emoji counts
+
+    Args:
+        matrix (dict, optional): lists of "canvas", "size" and "count". Defaults to `QUICK_MATRIX`.
+        placement (str, optional): the placement mode of `plot_dense_emoji_cloud`. Defaults to 'scan'.
+        search (str, optional): the search strategy of `plot_dense_emoji_cloud`. Defaults to 'linear'.
+        track_memory (bool, optional): whether to record the peak memory. Defaults to True.
+        repeat (int, optional): the count of runs of each case, keeping the fastest one. Defaults to 1.
+        log (callable, optional): a function called with the result of each case. Defaults to None.
+
+    Returns:
+        dict: "environment": the versions and platform, "results": a list of the results of `run_case`
+    """
+    import numpy as np
+    list_result = []
+    with tempfile.TemporaryDirectory() as mask_dir:
+        # warm up the lazy imports and allocations outside the measured cases
+        run_case('rectangle', 50, 3, mask_dir, placement, search, track_memory=False)
+        for canvas in matrix["canvas"]:
+            for size in matrix["size"]:
+                for count in matrix["count"]:
+                    list_run = [
+                        run_case(canvas, size, count, mask_dir, placement, search, track_memory and i == 0) for i in range(repeat)]
+                    # the fastest time, with the memory recorded by the first run
+                    result = dict(min(list_run, key=lambda r: r["wall"]), peak_memory=list_run[0]["peak_memory"])
+                    list_result.append(result)
+                    if (log is not None):
+                        log(result)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "results": list_result
+    }
+
+
+def get_case_key(result: dict) -> tuple:
+    return (result["canvas"], result["size"], result["count"], result["placement"], result["search"])
+
+
+def compare_results(results: dict, baseline: dict, threshold: float = 1.2) -> list[dict]:
+    """find the cases slower or using more memory than the baseline
+
+    Args:
+        results (dict): the results of `run_benchmark`
+        baseline (dict): the stored results of `run_benchmark`
+        threshold (float, optional): the ratio to the baseline above which a case regresses. Defaults to 1.2.
+
+    Returns:
+        list[dict]: the regressions, each with the case, the "metric" ('wall' or 'peak_memory'),
+            the "value", the "baseline" value and their "ratio"
+    """
+    dict_baseline = {get_case_key(result): result for result in baseline["results"]}
+    list_regression = []
+    for result in results["results"]:
+        result_baseline = dict_baseline.get(get_case_key(result))
+        if (result_baseline is None):
+            continue
+        for metric in ("wall", "peak_memory"):
+            value, value_baseline = result[metric], result_baseline[metric]
+            if (value is None or not value_baseline):
+                continue
+            ratio = value / value_baseline
+            if (ratio > threshold):
+                list_regression.append({
+                    "canvas": result["canvas"],
+                    "size": result["size"],
+                    "count": result["count"],
+                    "placement": result["placement"],
+                    "search": result["search"],
+                    "metric": metric,
+                    "value": value,
+                    "baseline": value_baseline,
+                    "ratio": ratio
+                })
+    return list_regression
+
+
+def format_result(result: dict) -> str:
+    spans = result["spans"]
+    peak_memory = "-" if result["peak_memory"] is None else "%.1f MB" % (result["peak_memory"] / 1024 / 1024)
+    return "%-9s %5d %5d  %8.3fs  search %.3fs  stamp %.3fs  sprites %.3fs  attempts %d  memory %s%s" % (
+        result["canvas"], result["size"], result["count"], result["wall"], spans.get("search", 0), spans.get("stamp", 0),
+        spans.get("resize", 0) + spans.get("trim", 0), result["counters"].get("attempts", 0), peak_memory,
+        "" if result["success"] else "  (failed)")
+
+
+def main(argv: list[str] = None) -> int:
+    """run the benchmark from the command line
+
+    Returns:
+        int: the exit code, 1 if any case regresses from the baseline given by --baseline,
+            or from the stored baseline if recorded on the same platform and CPU count
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m EmojiCloud.benchmark', description="benchmark plotting emoji clouds of synthetic emojis")
+    parser.add_argument('--full', action='store_true', help="run the full matrix, up to 2000 emojis on 720 pixel canvases")
+    parser.add_argument('--canvas', nargs='+', help="the canvases: rectangle, ellipse, masked")
+    parser.add_argument('--size', nargs='+', type=int, help="the canvas sizes")
+    parser.add_argument('--count', nargs='+', type=int, help="the emoji counts")
+    parser.add_argument('--placement', default='scan', help="the placement mode, default: scan")
+    parser.add_argument('--search', default='linear', help="the search strategy, default: linear")
+    parser.add_argument('--repeat', type=int, default=3, help="the runs of each case, keeping the fastest one, default: 3")
+    parser.add_argument('--no-memory', action='store_true', help="skip recording the peak memory")
+    parser.add_argument('--output', help="the JSON file to write the results to")
+    parser.add_argument('--baseline', help="the JSON file of the results to compare with, default: the stored baseline")
+    parser.add_argument('--no-baseline', action='store_true', help="skip comparing with a baseline")
+    parser.add_argument('--threshold', type=float, default=1.2, help="the ratio to the baseline flagged as a regression, default: 1.2")
+    args = parser.parse_args(argv)
+
+    matrix = dict(FULL_MATRIX if args.full else QUICK_MATRIX)
+    for name in ('canvas', 'size', 'count'):
+        if (getattr(args, name)):
+            matrix[name] = getattr(args, name)
+
+    results = run_benchmark(matrix, args.placement, args.search, not args.no_memory, args.repeat,
+                            log=lambda result: print(format_result(result)))
+    if (args.output):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if (not args.no_baseline):
+        with open(args.baseline or BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # times of the stored baseline only tell regressions on a machine like the one recording it
+        gate = True
+        environment = baseline.get("environment", {})
+        if ((environment.get("platform"), environment.get("cpu_count")) != (results["environment"]["platform"], results["environment"]["cpu_count"])):
+            gate = args.baseline is not None
+            print("note: the baseline was recorded on %s with %s CPUs, write a baseline of this machine by --output%s" % (
+                environment.get("platform"), environment.get("cpu_count"), "" if gate else ", regressions do not fail"))
+        list_regression = compare_results(results, baseline, args.threshold)
+        for regression in list_regression:
+            print("regression: %s %d %d %s %.3g -> %.3g (x%.2f)" % (
+                regression["canvas"], regression["size"], regression["count"], regression["metric"],
+                regression["baseline"], regression["value"], regression["ratio"]))
+        if (list_regression and gate):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
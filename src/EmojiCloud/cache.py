@@ -0,0 +1,324 @@
+import io
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .sprite import Sprite
+from .metrics import increment
+
+
+class SpriteCache():
+    """a bounded, thread-safe LRU cache of prepared sprites
+
+    Sprites are keyed by `(vendor, unicode, (width, height), thold_alpha_bb)`, where (width, height) is the size of the
+    resized emoji image, so repeated plotting of the same emoji at the same size skips resizing and preparing the image.
+    The least recently used sprites are evicted once the cache holds more than `max_bytes` or `max_items`.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_items: int = None):
+        """
+        Args:
+            max_bytes (int, optional): the maximum total size of the cached arrays, 0 to disable caching. Defaults to 256 MB.
+            max_items (int, optional): the maximum count of cached sprites. Defaults to None, no limit.
+        """
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._dict_sprite = OrderedDict()  # key: sprite key, value: Sprite
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._dict_sprite)
+
+    def __contains__(self, key):
+        return key in self._dict_sprite
+
+    def get(self, key) -> Sprite:
+        """get a cached sprite and mark it as recently used
+
+        Args:
+            key: the sprite key
+
+        Returns:
+            Sprite: the cached sprite, None if not cached
+        """
+        with self._lock:
+            sprite = self._dict_sprite.get(key)
+            if (sprite is None):
+                self.misses += 1
+            else:
+                self._dict_sprite.move_to_end(key)
+                self.hits += 1
+        increment('sprite_cache_misses' if sprite is None else 'sprite_cache_hits')
+        return sprite
+
+    def put(self, key, sprite: Sprite):
+        """cache a sprite, evicting the least recently used ones beyond the limits
+
+        Args:
+            key: the sprite key
+            sprite (Sprite): the prepared sprite
+        """
+        with self._lock:
+            if (key in self._dict_sprite):
+                self.nbytes -= self._dict_sprite.pop(key).nbytes
+            self._dict_sprite[key] = sprite
+            self.nbytes += sprite.nbytes
+            self._evict()
+
+    def get_or_create(self, key, create) -> Sprite:
+        """get a cached sprite, or create and cache it
+
+        Args:
+            key: the sprite key, None to skip the cache
+            create (callable): a function without arguments returning the sprite
+
+        Returns:
+            Sprite: the sprite
+        """
+        if (key is None or self.max_bytes == 0):
+            return create()
+        sprite = self.get(key)
+        if (sprite is None):
+            # prepared outside the lock, a concurrent miss of the same key may prepare it twice
+            sprite = create()
+            self.put(key, sprite)
+        return sprite
+
+    def configure(self, max_bytes: int = None, max_items: int = None):
+        """change the limits of the cache
+
+        Args:
+            max_bytes (int, optional): the maximum total size of the cached arrays. Defaults to None, unchanged.
+            max_items (int, optional): the maximum count of cached sprites. Defaults to None, unchanged.
+        """
+        with self._lock:
+            if (max_bytes is not None):
+                self.max_bytes = max_bytes
+            if (max_items is not None):
+                self.max_items = max_items
+            self._evict()
+
+    def clear(self):
+        """remove all cached sprites and reset the statistics"""
+        with self._lock:
+            self._dict_sprite.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        """the statistics of the cache
+
+        Returns:
+            dict: keys: "hits", "misses", "evictions", "items" and "nbytes"
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "items": len(self._dict_sprite),
+                "nbytes": self.nbytes
+            }
+
+    def _evict(self):
+        while (len(self._dict_sprite) > 0 and (self.nbytes > self.max_bytes or
+               (self.max_items is not None and len(self._dict_sprite) > self.max_items))):
+            key, sprite = self._dict_sprite.popitem(last=False)
+            self.nbytes -= sprite.nbytes
+            self.evictions += 1
+
+
+# the process-wide cache used by plotting
+sprite_cache = SpriteCache()
+
+
+# the version of the results of `ResultCache`, increased whenever the placement or rendering of the same arguments changes,
+# so that results of an older version are not served
+RESULT_VERSION = 1
+
+
+class ResultCache():
+    """a content-addressed cache of emoji clouds and layouts on local disk
+
+    Results are keyed by a digest of the emojis, the canvas fingerprint and the plotting arguments, and stored as
+    PNG and JSON files under `directory`. Files are written atomically, so concurrent processes may share a directory.
+    The least recently used files are removed once the files take more than `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            directory (str): the directory of the cached files, created if missing
+            max_bytes (int, optional): the maximum total size of the cached files. Defaults to 1 GB.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._nbytes = None  # the total size of the cached files, scanned on the first write
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, canvas, emoji_list: list, **kwargs) -> str:
+        """calculate the key of a result
+
+        Args:
+            kind (str): the kind of the result, e.g. 'image' or 'layout'
+            canvas (CanvasBase): the canvas, by its `fingerprint`
+            emoji_list (list[EmojiItem]): the emojis, by their unicode, vendor and normalized weight, and by the pixels
+                of custom images, in any order
+            **kwargs: the plotting arguments, of JSON types
+
+        Returns:
+            str: the hex digest
+        """
+        weight_sum = sum(e.weight for e in emoji_list) or 1
+        list_emoji = []
+        for e in emoji_list:
+            d = e.asdict()
+            # relative to the sum and rounded, so scaled weights give the same key
+            d["weight"] = float('%.12g' % (e.weight / weight_sum))
+            if (e._im is not None and e.sprite_key is None):
+                # not the vendor's image
+                d["image"] = hashlib.sha256(e._im.tobytes()).hexdigest() + "-%s-%dx%d" % ((e._im.mode,) + e._im.size)
+            list_emoji.append(d)
+        # the placement orders emojis by weight and then unicode and vendor, not by their order in the list
+        list_emoji.sort(key=lambda d: (d["unicode"], d["vendor"], d.get("image", "")))
+        data = json.dumps({
+            "version": RESULT_VERSION, "kind": kind, "canvas": canvas.fingerprint(), "emojis": list_emoji, "args": kwargs
+        }, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ext)
+
+    def get_bytes(self, key: str, ext: str) -> bytes:
+        """read a cached file and mark it as recently used
+
+        Args:
+            key (str): the key of `make_key`
+            ext (str): the file extension, e.g. '.png'
+
+        Returns:
+            bytes: the file contents, None if not cached
+        """
+        path = self.get_path(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            data = None
+        with self._lock:
+            if (data is None):
+                self.misses += 1
+            else:
+                self.hits += 1
+        increment('result_cache_misses' if data is None else 'result_cache_hits')
+        return data
+
+    def put_bytes(self, key: str, ext: str, data: bytes):
+        """write a file to the cache atomically, removing the least recently used files beyond the size limit
+
+        Args:
+            key (str): the key of `make_key`
+            ext (str): the file extension, e.g. '.png'
+            data (bytes): the file contents
+        """
+        path = self.get_path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, path_tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(path_tmp, path)
+        except BaseException:
+            os.remove(path_tmp)
+            raise
+        with self._lock:
+            if (self._nbytes is None):
+                self._nbytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._nbytes += len(data)
+            if (self._nbytes > self.max_bytes):
+                self._evict()
+
+    def get_image(self, key: str):
+        """get a cached emoji cloud
+
+        Returns:
+            Image.Image: the image, None if not cached
+        """
+        data = self.get_bytes(key, '.png')
+        if (data is None):
+            return None
+        from PIL import Image
+        im = Image.open(io.BytesIO(data))
+        im.load()
+        return im
+
+    def put_image(self, key: str, im):
+        """cache an emoji cloud as a PNG file"""
+        f = io.BytesIO()
+        im.save(f, 'PNG', compress_level=1)
+        self.put_bytes(key, '.png', f.getvalue())
+
+    def get_layout(self, key: str):
+        """get a cached layout
+
+        Returns:
+            Layout: the layout, None if not cached
+        """
+        data = self.get_bytes(key, '.json')
+        if (data is None):
+            return None
+        from .layout import Layout
+        return Layout.from_json(data.decode())
+
+    def put_layout(self, key: str, layout):
+        """cache a layout as a JSON file"""
+        self.put_bytes(key, '.json', layout.to_json().encode())
+
+    def clear(self):
+        """remove all cached files"""
+        with self._lock:
+            for path, _, _ in self._scan():
+                os.remove(path)
+            self._nbytes = 0
+
+    def _scan(self):
+        # (path, size, last use) of the cached files, skipping the ones being written or removed concurrently
+        list_file = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if (name.endswith('.tmp')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                list_file.append((path, stat.st_size, stat.st_mtime))
+        return list_file
+
+    def _evict(self):
+        list_file = sorted(self._scan(), key=lambda file: file[2])
+        self._nbytes = sum(size for _, size, _ in list_file)
+        for path, size, _ in list_file:
+            if (self._nbytes <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._nbytes -= size
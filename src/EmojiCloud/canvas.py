@@ -1,4 +1,9 @@
+import json
+import hashlib
+import numpy as np
+
 from .util import *
+from .sprite import trim_image_array
 
 class CanvasBase():
     """the base class for all canvas objects
@@ -7,7 +12,7 @@ class CanvasBase():
     * `self.w` , `self.h` - the width and height of the canvas
     * `self.img` - the Image object
     * `self.area` - the area of the canvas
-    * `self.map_occupied` - a 2D list of whether the each pixel in the canvas is occupied or not 
+    * `self.map_occupied` - a 2D boolean NumPy array of whether the each pixel in the canvas is occupied or not, indexed by `[x, y]`
     """
     @property
     def center_x(self) -> int:
@@ -20,31 +25,84 @@ class CanvasBase():
     def calculate_sorted_canvas_pix_for_plotting(self):
         """calculate a sorted list of canvas pixels based its distance to the canvas center point
 
+        Pixels at the same distance are ordered by x and then y. The result is cached on the canvas
+        and recalculated only if `map_occupied` has changed since.
+
         Returns:
-            list_canvas_pix: a list of tuple (x,y) sorted by its distance to the canvas center
+            list_canvas_pix: a read-only int32 array of shape (n, 2), each row is (x, y) of an unoccupied pixel, sorted by its distance to the canvas center
         """
-        # points to be checked in an order determined by its distance from the center point of the image center
-        # key: (x, y), value: the distance to the center of canvas
-        dict_dist_canvas_center = {}
-        for x in range(self.w):
-            for y in range(self.h):
-                if (self.map_occupied[x][y] == 0):
-                    dist = distance_between_two_points(
-                        x, y, self.center_x, self.center_y)
-                    dict_dist_canvas_center[(x, y)] = dist
-        list_canvas_pix_dist = sort_dictionary_by_value(
-            dict_dist_canvas_center, reverse=False)
-        list_canvas_pix = [x_y for (x_y, dist) in list_canvas_pix_dist]
+        map_occupied = np.asarray(self.map_occupied, dtype=bool)
+        cache = getattr(self, '_sorted_canvas_pix_cache', None)
+        if (cache is not None and np.array_equal(cache[0], map_occupied)):
+            return cache[1]
+        # unoccupied pixels ordered by x and then y
+        list_x, list_y = np.nonzero(~map_occupied)
+        list_x = list_x.astype(np.int32)
+        list_y = list_y.astype(np.int32)
+        # squared distance to the canvas center, sorted stably to keep the order of ties
+        dist = (list_x.astype(np.int64) - self.center_x) ** 2 + (list_y.astype(np.int64) - self.center_y) ** 2
+        order = np.argsort(dist, kind='stable')
+        list_canvas_pix = np.stack([list_x[order], list_y[order]], axis=1)
+        list_canvas_pix.flags.writeable = False
+        self._sorted_canvas_pix_cache = (map_occupied.copy(), list_canvas_pix)
         return list_canvas_pix
 
+    def fingerprint(self) -> str:
+        """a digest of the contents of the canvas, the occupancy map and the image, equal for canvases plotting the same emoji clouds
 
-class RectangleCanvas(CanvasBase):
-    def __init__(self, w: int, h: int, color: str = 'white'):
+        The digest is calculated on each call rather than kept, so it follows any change of the canvas.
+
+        Returns:
+            str: the hex digest
+        """
+        h = hashlib.sha256()
+        h.update(json.dumps([type(self).__name__, self.w, self.h, self.area]).encode())
+        h.update(np.packbits(np.asarray(self.map_occupied, dtype=bool)).tobytes())
+        h.update(self.img.tobytes())
+        return h.hexdigest()
+
+
+class ShapeCanvas(CanvasBase):
+    """a canvas whose unoccupied pixels are the ones inside a shape
+
+    The shape is a vectorized predicate `inside(x, y)`, where `x` is an int array of shape (w, 1) and `y` of shape (1, h),
+    returning a boolean array broadcastable to (w, h) of whether each pixel (x, y) is inside the shape.
+    Pass the predicate to the constructor, e.g. one made by `make_polygon_shape`, or override the `inside` method in a subclass.
+    """
+    def __init__(self, w: int, h: int, inside=None, color: str = 'white'):
+        """
+        Args:
+            w (int): the width of the canvas
+            h (int): the height of the canvas
+            inside (callable, optional): the predicate of the shape. Defaults to the `inside` method.
+            color (str, optional): the background color. Defaults to 'white'.
+        """
         self.w = w
         self.h = h
         self.color = color
         self.img = Image.new('RGBA', (w, h), color=color)
-        self.map_occupied = [[0 for i in range(h)] for j in range(w)]
+        if (inside is None):
+            inside = self.inside
+        x = np.arange(w)[:, np.newaxis]
+        y = np.arange(h)[np.newaxis, :]
+        self.map_occupied = ~np.broadcast_to(np.asarray(inside(x, y), dtype=bool), (w, h))
+        self._area = int(w * h - self.map_occupied.sum())
+
+    def inside(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """the predicate of the shape, see `ShapeCanvas`"""
+        raise NotImplementedError("pass a shape predicate or override `inside`")
+
+    @property
+    def area(self):
+        return self._area
+
+
+class RectangleCanvas(ShapeCanvas):
+    def __init__(self, w: int, h: int, color: str = 'white'):
+        super().__init__(w, h, color=color)
+
+    def inside(self, x, y):
+        return np.ones((1, 1), dtype=bool)
 
     @property
     def area(self):
@@ -74,24 +132,113 @@ def check_point_within_ellipse(center_x, center_y, x, y, radius_x, radius_y):
         return False
 
 
-class EllipseCanvas(CanvasBase):
+class EllipseCanvas(ShapeCanvas):
     def __init__(self, w: int = 72*10, h: int = 72*10, color: str = 'white'):
-        self.w = w
-        self.h = h
-        self.color = color
-        self.img = Image.new('RGBA', (w, h), color=color)
-        self.map_occupied = [[1 for i in range(h)] for j in range(w)]
-        for x in range(w):
-            for y in range(h):
-                flag = check_point_within_ellipse(self.center_x, self.center_y, x, y, w/2, h/2)
-                if (flag):
-                    self.map_occupied[x][y] = 0
+        super().__init__(w, h, color=color)
+
+    def inside(self, x, y):
+        # `check_point_within_ellipse` for all points at once
+        radius_x = self.w/2
+        radius_y = self.h/2
+        p = (((x - self.center_x) ** 2.0 / radius_x ** 2.0) +
+             ((y - self.center_y) ** 2.0 / radius_y ** 2.0))
+        return p <= 1
 
     @property
     def area(self):
         return (self.w/2) * (self.h/2) * math.pi
 
 
+def make_polygon_shape(list_point: list[tuple[float, float]]):
+    """make the predicate of a polygon for `ShapeCanvas`, using the even-odd rule
+
+    Args:
+        list_point (list[tuple[float, float]]): the vertices (x, y) of the polygon in order
+
+    Returns:
+        the predicate `inside(x, y)`
+    """
+    def inside(x, y):
+        flag = np.zeros(np.broadcast_shapes(np.shape(x), np.shape(y)), dtype=bool)
+        for (x_1, y_1), (x_2, y_2) in zip(list_point, list_point[1:] + list_point[:1]):
+            if (y_1 == y_2):
+                continue
+            # the edge crosses the horizontal ray from the point to the right
+            crossing = ((y_1 > y) != (y_2 > y)) & (x < (x_2 - x_1) * (y - y_1) / (y_2 - y_1) + x_1)
+            flag ^= crossing
+        return flag
+    return inside
+
+
+def make_rounded_rectangle_shape(w: int, h: int, radius: float):
+    """make the predicate of a rectangle with rounded corners filling a w by h canvas for `ShapeCanvas`
+
+    Args:
+        w (int): the width of the canvas
+        h (int): the height of the canvas
+        radius (float): the radius of the corners
+
+    Returns:
+        the predicate `inside(x, y)`
+    """
+    def inside(x, y):
+        # distance to the inner rectangle where the corner circles are centered
+        dist_x = np.maximum(np.maximum(radius - x, x - (w - 1 - radius)), 0)
+        dist_y = np.maximum(np.maximum(radius - y, y - (h - 1 - radius)), 0)
+        return dist_x ** 2 + dist_y ** 2 <= radius ** 2
+    return inside
+
+
+def make_heart_shape(w: int, h: int):
+    """make the predicate of a heart filling a w by h canvas for `ShapeCanvas`
+
+    Args:
+        w (int): the width of the canvas
+        h (int): the height of the canvas
+
+    Returns:
+        the predicate `inside(x, y)`
+    """
+    def inside(x, y):
+        # the heart curve (u^2 + v^2 - 1)^3 = u^2 * v^3 spans about [-1.14, 1.14] x [-1, 1.25]
+        u = (x - w/2) / (w/2) * 1.14
+        v = 0.125 - (y - h/2) / (h/2) * 1.125
+        return (u ** 2 + v ** 2 - 1) ** 3 - u ** 2 * v ** 3 <= 0
+    return inside
+
+
+def calculate_contour_mask(alpha: np.ndarray, thold_alpha=10) -> np.ndarray:
+    """calculate the contour of an alpha channel
+
+    A pixel is on the contour if its alpha differs by more than the threshold from the alpha of the last contour pixel
+    before it, scanning each column from top to bottom and each row except the first one from left to right.
+    All columns (or rows) are scanned at once.
+
+    Args:
+        alpha (np.ndarray): the alpha channel of an image, indexed by [x, y]
+        thold_alpha: the threshold to distinguish the colors on the contour and outside the contour
+
+    Returns:
+        np.ndarray: a boolean array of whether each pixel is on the contour, indexed by [x, y]
+    """
+    alpha = np.asarray(alpha, dtype=np.int16)
+    width, height = alpha.shape
+    contour = np.zeros((width, height), dtype=bool)
+    # identify contour by row
+    prev_alpha = alpha[:, 0]
+    for y in range(1, height):
+        changed = np.abs(alpha[:, y] - prev_alpha) > thold_alpha
+        contour[:, y] |= changed
+        prev_alpha = np.where(changed, alpha[:, y], prev_alpha)
+    # identify contour by column
+    prev_alpha = alpha[0, 1:]
+    for x in range(width):
+        changed = np.abs(alpha[x, 1:] - prev_alpha) > thold_alpha
+        contour[x, 1:] |= changed
+        prev_alpha = np.where(changed, alpha[x, 1:], prev_alpha)
+    return contour
+
+
 def calculate_contour(im, thold_alpha=10):
     """calculate the contour of the given image
 
@@ -102,31 +249,30 @@ def calculate_contour(im, thold_alpha=10):
     Returns:
         list_contour: the list of (x, y) on the contour
     """
-    # read image
-    img_data = im.getdata()
-    width, height = im.size
-    dict_pixel = {}  # key: coordinate, value: RGB value
-    # check pixels
-    for index, pixel in enumerate(img_data):
-        x = index % width
-        y = int(index / width)
-        dict_pixel[tuple([x, y])] = pixel
-    # identify contour by row
-    list_contour = []
-    for x in range(width):
-        prev_alpha = dict_pixel[tuple([x, 0])][3]
-        for y in range(1, height):
-            if (abs(dict_pixel[tuple([x, y])][3] - prev_alpha) > thold_alpha):
-                list_contour.append(tuple([x, y]))
-                prev_alpha = dict_pixel[tuple([x, y])][3]
-    # identify contour by column
-    for y in range(1, height):
-        prev_alpha = dict_pixel[tuple([0, y])][3]
-        for x in range(width):
-            if (abs(dict_pixel[tuple([x, y])][3] - prev_alpha) > thold_alpha):
-                list_contour.append(tuple([x, y]))
-                prev_alpha = dict_pixel[tuple([x, y])][3]
-    return list_contour
+    alpha = np.asarray(im.convert('RGBA'))[:, :, 3].T
+    list_x, list_y = np.nonzero(calculate_contour_mask(alpha, thold_alpha))
+    return list(zip(list_x.tolist(), list_y.tolist()))
+
+
+def dilate_mask(mask: np.ndarray, width: int) -> np.ndarray:
+    """expand each True pixel of a mask to a `width` by `width` square with the pixel at its top-left corner
+
+    Args:
+        mask (np.ndarray): a 2D boolean array
+        width (int): the width of the square
+
+    Returns:
+        np.ndarray: the dilated mask, of the same shape as `mask`
+    """
+    w, h = mask.shape
+    # the square is separable into a horizontal and a vertical line
+    mask_x = np.zeros((w, h), dtype=bool)
+    for i in range(min(width, w)):
+        mask_x[i:, :] |= mask[:w - i, :]
+    mask_xy = np.zeros((w, h), dtype=bool)
+    for j in range(min(width, h)):
+        mask_xy[:, j:] |= mask_x[:, :h - j]
+    return mask_xy
 
 
 class MaskedCanvas(CanvasBase):
@@ -145,25 +291,33 @@ class MaskedCanvas(CanvasBase):
         self.w = im.size[0] + contour_width*2
         self.h = im.size[1] + contour_width*2
 
-        img_mask_within_bb = remove_pixel_outside_bb(im, thold_alpha_bb)
-        # parse masked image
-        self.dict_opacity = parse_image_by_array(img_mask_within_bb)
+        # the masked image within its bounding box, indexed by [x, y]
+        self._rgba_mask = trim_image_array(np.asarray(im), thold_alpha_bb).transpose(1, 0, 2)
+        alpha = self._rgba_mask[:, :, 3]
+        mask_w, mask_h = alpha.shape
         self.img = Image.new('RGBA', (self.w, self.h), color="white")
 
-        self.map_occupied = [[1 for i in range(self.h)] for j in range(self.w)]
         # set pixels in the mask image as unoccupied
-        for (x, y) in self.dict_opacity:
-            self.map_occupied[x][y] = 0
+        self.mask_opacity = np.zeros((self.w, self.h), dtype=bool)
+        self.mask_opacity[:mask_w, :mask_h] = alpha != 0
+        self._area = int(self.mask_opacity.sum())
+        self.map_occupied = ~self.mask_opacity
 
         # process contour 
-        list_contour = calculate_contour(img_mask_within_bb, thold_alpha_contour)
+        contour = np.zeros((self.w, self.h), dtype=bool)
+        contour[:mask_w, :mask_h] = calculate_contour_mask(alpha, thold_alpha_contour)
         # contour width 
-        for (x, y) in list_contour:
-            for i in range(contour_width):
-                for j in range(contour_width):
-                    self.img.putpixel((x + i, y + j), contour_color)
-                    self.map_occupied[x + i][y + j] = 1
+        contour = dilate_mask(contour, contour_width)
+        self.img.paste(contour_color, mask=Image.fromarray(contour.T))
+        self.map_occupied |= contour
+
+    @property
+    def dict_opacity(self):
+        """key: coordinate of an opaque pixel in the mask image, value: the RGBA value"""
+        list_x, list_y = np.nonzero(self._rgba_mask[:, :, 3])
+        list_pixel = map(tuple, self._rgba_mask[list_x, list_y].tolist())
+        return dict(zip(zip(list_x.tolist(), list_y.tolist()), list_pixel))
 
     @property
     def area(self):
-        return len(self.dict_opacity)
+        return self._area
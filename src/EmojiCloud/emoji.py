@@ -1,8 +1,13 @@
+from __future__ import annotations
 import os
+from typing import TYPE_CHECKING
 from dataclasses import dataclass, field, asdict
-from PIL import Image
 
 from .config import data_dir
+from .availability import vendor_index
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 def parse_emoji_unicode(code: str) -> str:
@@ -30,14 +35,32 @@ class EmojiItem:
     weight: float
     vendor: str
     _im: Image.Image = field(default=None, init=False)
+    _im_from_file: bool = field(default=False, init=False, repr=False)
 
     def __post_init__(self):
         self.unicode = parse_emoji_unicode(self.unicode)
 
+    @classmethod
+    def from_image(cls, unicode: str, weight: float, vendor: str, im: Image.Image, vendor_image: bool = False) -> EmojiItem:
+        """Create an emoji item of an image in memory instead of the vendor's image file
+
+        Args:
+            unicode (str): unicode of the emoji
+            weight (float): weight of the emoji
+            vendor (str): vendor of the emoji
+            im (Image.Image): the RGBA image of the emoji
+            vendor_image (bool, optional): whether the image stands for the vendor's image of the unicode, so its prepared
+                sprites are cached by vendor and unicode like the images read from files. Defaults to False, a custom image.
+        """
+        e = cls(unicode=unicode, weight=weight, vendor=vendor)
+        e._im = im
+        e._im_from_file = vendor_image
+        return e
+
     def exists(self) -> bool:
         """Check if the current emoji item instance exists
         """
-        return os.path.exists(self.fullpath)
+        return EmojiManager.check_exists(self.unicode, self.vendor)
 
     @property
     def fullpath(self) -> str:
@@ -46,9 +69,24 @@ class EmojiItem:
     @property
     def image(self):
         if not self._im:
-            self._im = Image.open(self.fullpath).convert("RGBA")
+            # imported on first use, the atlas imports NumPy
+            from PIL import Image
+            from .atlas import load_atlas
+            # read from the vendor's atlas if built, otherwise decode the PNG file
+            atlas = load_atlas(self.vendor)
+            if atlas is not None and self.unicode in atlas:
+                self._im = atlas.get_image(self.unicode)
+            else:
+                self._im = Image.open(self.fullpath).convert("RGBA")
+            self._im_from_file = True
         return self._im
 
+    @property
+    def sprite_key(self):
+        """The key of the emoji image for caching its prepared sprites, None if the image is not the vendor's one
+        """
+        return (self.vendor, self.unicode) if self._im_from_file else None
+
     def asdict(self):
         return {
             "unicode": self.unicode,
@@ -68,8 +106,21 @@ class EmojiManager:
             unicode (str): unicode of the emoji
             vendor (str): vendor of the emoji
         """
-        path = os.path.join(data_dir, vendor, "%s.png" % unicode)
-        return os.path.exists(path)
+        return vendor_index.exists(unicode, vendor)
+
+
+    @staticmethod
+    def filter_exist_unicodes(unicodes: list[str], vendor: str) -> list[str]:
+        """Find which of the given unicodes exist for a vendor
+
+        Args:
+            unicodes (list[str]): unicodes of the emojis
+            vendor (str): vendor of the emojis
+
+        Returns:
+            list[str]: the existing unicodes in the given order
+        """
+        return vendor_index.filter_exist(unicodes, vendor)
 
 
     @staticmethod
@@ -135,4 +186,4 @@ class EmojiManager:
         Returns:
             list[EmojiItem]: the filtered list result
         """
-        return list(filter(lambda e: e.exists(), items))
\ No newline at end of file
+        return [e for e in items if vendor_index.exists(e.unicode, e.vendor)]
\ No newline at end of file
@@ -0,0 +1,67 @@
+import json
+from dataclasses import dataclass, asdict
+
+
+@dataclass(frozen=True)
+class Placement:
+    """the placement of an emoji in a layout"""
+    unicode: str
+    vendor: str
+    # the canvas pixel of the emoji center, the integer centroid of its opaque pixels
+    x: int
+    y: int
+    # the zoom factor from the original emoji image
+    scale: float
+    # the size of the zoomed emoji image
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class Layout:
+    """the placements of the emojis of an emoji cloud, without the pixels
+
+    A layout is rendered at any resolution by `plot.render_layout`.
+    """
+    # the size of the canvas
+    width: int
+    height: int
+    # the relax ratio the emojis were placed with
+    relax_ratio: float
+    # the threshold of `plot_dense_emoji_cloud` to trim the emoji images
+    thold_alpha_bb: float
+    # in the order of plotting, from the largest weight
+    placements: tuple[Placement, ...]
+
+    def to_dict(self) -> dict:
+        """convert the layout to a dictionary of JSON types
+
+        Returns:
+            dict: the fields of the layout, "placements" being a list of dictionaries of the fields of `Placement`
+        """
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'Layout':
+        """create a layout from the dictionary of `to_dict`
+
+        Args:
+            d (dict): the dictionary
+
+        Returns:
+            Layout: the layout
+        """
+        return cls(
+            width=d['width'],
+            height=d['height'],
+            relax_ratio=d['relax_ratio'],
+            thold_alpha_bb=d['thold_alpha_bb'],
+            placements=tuple(Placement(**p) for p in d['placements'])
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, s: str) -> 'Layout':
+        return cls.from_dict(json.loads(s))
@@ -0,0 +1,205 @@
+import threading
+import functools
+import contextlib
+import tracemalloc
+from contextvars import ContextVar
+from dataclasses import dataclass
+from timeit import default_timer as timer
+
+
+@dataclass(frozen=True)
+class Span:
+    """a timed phase of plotting"""
+    name: str
+    # the start time in seconds, from `timeit.default_timer`
+    start: float
+    # the duration in seconds
+    duration: float
+    # the names of the enclosing spans, outermost first
+    parents: tuple[str, ...]
+    # the peak traced memory in bytes during the span, None if memory is not tracked
+    peak_memory: int = None
+
+
+class MetricsCollector():
+    """a collector of the spans and counters recorded while plotting
+
+    Spans are aggregated by name and passed to `sink` one by one. Counters are summed by name.
+    Subclass and override `record_span` or `increment` to send the metrics elsewhere.
+
+    The spans and counters are recorded in the thread or task where `collect_metrics` is entered,
+    not in the worker processes of the parallel search.
+
+    Spans:
+    * `plot` - `plot_dense_emoji_cloud` or `layout_dense_emoji_cloud`
+    * `update` - `update_layout`
+    * `canvas_order` - sorting the canvas pixels by distance to the center
+    * `load` - loading the emoji images and creating the placement plan
+    * `attempt` - plotting all emojis given a relax ratio
+    * `resize` - resizing an emoji image
+    * `trim` - trimming an emoji image to its bounding box
+    * `search` - finding the position of an emoji
+    * `stamp` - marking the pixels of an emoji as occupied
+    * `composite` - drawing the emojis of an attempt
+
+    Counters:
+    * `attempts` - relax ratios tried
+    * `candidates` - emoji positions examined
+    * `pixel_tests` - emoji pixels tested against the occupancy map
+    * `emojis_plotted` - emojis plotted over all attempts
+    * `sprite_cache_hits`, `sprite_cache_misses` - lookups of the sprite cache
+    * `result_cache_hits`, `result_cache_misses` - lookups of a `ResultCache`
+    """
+
+    def __init__(self, sink=None, track_memory: bool = False):
+        """
+        Args:
+            sink (callable, optional): a function called with each finished `Span`. Defaults to None.
+            track_memory (bool, optional): whether to record the peak memory of spans with `tracemalloc`, which slows down plotting. Defaults to False.
+        """
+        self.sink = sink
+        self.track_memory = track_memory
+        self._lock = threading.Lock()
+        self.spans = {}  # key: span name, value: dict of "count", "total", "max" and "peak_memory"
+        self.counters = {}  # key: counter name, value: sum
+
+    def record_span(self, span: Span):
+        """aggregate a finished span and pass it to the sink
+
+        Args:
+            span (Span): the finished span
+        """
+        with self._lock:
+            stats = self.spans.get(span.name)
+            if (stats is None):
+                stats = self.spans[span.name] = {"count": 0, "total": 0.0, "max": 0.0, "peak_memory": None}
+            stats["count"] += 1
+            stats["total"] += span.duration
+            stats["max"] = max(stats["max"], span.duration)
+            if (span.peak_memory is not None):
+                stats["peak_memory"] = max(stats["peak_memory"] or 0, span.peak_memory)
+        if (self.sink is not None):
+            self.sink(span)
+
+    def increment(self, name: str, value: int = 1):
+        """add to a counter
+
+        Args:
+            name (str): the counter name
+            value (int, optional): the amount to add. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict:
+        """the aggregated metrics
+
+        Returns:
+            dict: "spans": key: span name, value: dict of "count", "total" and "max" seconds and "peak_memory" bytes,
+                "counters": key: counter name, value: sum
+        """
+        with self._lock:
+            return {
+                "spans": {name: dict(stats) for name, stats in self.spans.items()},
+                "counters": dict(self.counters)
+            }
+
+
+# the collector of the current context, None if metrics are disabled
+_collector = ContextVar('EmojiCloud_metrics_collector', default=None)
+# the names and child peak memory of the open spans of the current context
+_span_stack = ContextVar('EmojiCloud_metrics_span_stack', default=())
+
+_null_span = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def collect_metrics(collector: MetricsCollector = None, sink=None, track_memory: bool = False):
+    """collect the metrics of plotting within the context
+
+    Args:
+        collector (MetricsCollector, optional): the collector. Defaults to a new `MetricsCollector(sink, track_memory)`.
+        sink (callable, optional): a function called with each finished `Span` by the new collector. Defaults to None.
+        track_memory (bool, optional): whether the new collector records the peak memory of spans. Defaults to False.
+
+    Yields:
+        MetricsCollector: the collector
+    """
+    if (collector is None):
+        collector = MetricsCollector(sink, track_memory)
+    start_tracing = collector.track_memory and not tracemalloc.is_tracing()
+    if (start_tracing):
+        tracemalloc.start()
+    token = _collector.set(collector)
+    token_stack = _span_stack.set(())
+    try:
+        yield collector
+    finally:
+        _span_stack.reset(token_stack)
+        _collector.reset(token)
+        if (start_tracing):
+            tracemalloc.stop()
+
+
+def span(name: str):
+    """a context manager recording a span of the given name, doing nothing if metrics are disabled
+
+    Args:
+        name (str): the span name
+    """
+    collector = _collector.get()
+    if (collector is None):
+        return _null_span
+    return _record_span(collector, name)
+
+
+@contextlib.contextmanager
+def _record_span(collector: MetricsCollector, name: str):
+    track_memory = collector.track_memory and tracemalloc.is_tracing()
+    stack = _span_stack.get()
+    # the peak memory of the children of this span, since the peak is reset for each span
+    child_peak = [0]
+    token = _span_stack.set(stack + ((name, child_peak),))
+    if (track_memory):
+        if (len(stack) > 0):
+            stack[-1][1][0] = max(stack[-1][1][0], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    start = timer()
+    try:
+        yield
+    finally:
+        duration = timer() - start
+        peak_memory = None
+        if (track_memory):
+            peak_memory = max(tracemalloc.get_traced_memory()[1], child_peak[0])
+            if (len(stack) > 0):
+                stack[-1][1][0] = max(stack[-1][1][0], peak_memory)
+        _span_stack.reset(token)
+        collector.record_span(Span(name, start, duration, tuple(n for n, _ in stack), peak_memory))
+
+
+def increment(name: str, value: int = 1):
+    """add to a counter of the current collector, doing nothing if metrics are disabled
+
+    Args:
+        name (str): the counter name
+        value (int, optional): the amount to add. Defaults to 1.
+    """
+    collector = _collector.get()
+    if (collector is not None):
+        collector.increment(name, value)
+
+
+def timed(name: str):
+    """a decorator recording each call of the function as a span of the given name
+
+    Args:
+        name (str): the span name
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
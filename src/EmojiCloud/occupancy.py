@@ -0,0 +1,368 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .metrics import increment
+
+# the coarse grid of `CoarseOccupancyGrid` has at most this many cells along each axis
+COARSE_GRID_SIZE = 128
+# the maximum count of mask pixels tested at once by `OccupancyGrid.check_fit_batch`, bounding its temporary arrays
+FIT_TEST_BUDGET = 1 << 22
+
+
+def calculate_summed_area_table(map_occupied: np.ndarray) -> np.ndarray:
+    """calculate the summed-area table (integral image) of a 2D boolean array
+
+    Args:
+        map_occupied (np.ndarray): a 2D boolean array indexed by [x, y]
+
+    Returns:
+        np.ndarray: an array of shape (w + 1, h + 1), where `[x, y]` is the count of True cells in `[:x, :y]`
+    """
+    w, h = map_occupied.shape
+    sat = np.zeros((w + 1, h + 1), dtype=np.int32)
+    np.cumsum(map_occupied, axis=0, dtype=np.int32, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def find_solid_blocks(mask: np.ndarray, num_split: int = 8) -> np.ndarray:
+    """split a mask into coarse blocks and find the blocks whose pixels are all opaque
+
+    An occupied pixel inside any solid block means the mask cannot be placed,
+    which can be checked with the summed-area table in constant time.
+
+    Args:
+        mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+        num_split (int, optional): the number of blocks along each axis. Defaults to 8.
+
+    Returns:
+        np.ndarray: an array of shape (num_block, 4), each row is (x0, y0, x1, y1) with exclusive ends
+    """
+    mask_w, mask_h = mask.shape
+    block_w = -(-mask_w // num_split)
+    block_h = -(-mask_h // num_split)
+    x0, y0 = np.meshgrid(np.arange(0, mask_w, block_w), np.arange(0, mask_h, block_h), indexing='ij')
+    x1 = np.minimum(x0 + block_w, mask_w)
+    y1 = np.minimum(y0 + block_h, mask_h)
+    sat = calculate_summed_area_table(mask)
+    count = sat[x1, y1] - sat[x0, y1] - sat[x1, y0] + sat[x0, y0]
+    solid = count == (x1 - x0) * (y1 - y0)
+    return np.stack([x0[solid], y0[solid], x1[solid], y1[solid]], axis=1)
+
+
+def max_pool(array: np.ndarray, factor: int, pad_value: bool = False) -> np.ndarray:
+    """downsample a 2D boolean array by blocks of factor x factor cells, a block being True if any of its cells is True
+
+    Args:
+        array (np.ndarray): a 2D boolean array indexed by [x, y]
+        factor (int): the size of the blocks
+        pad_value (bool, optional): the value of the cells beyond the array in the blocks at the end of each axis. Defaults to False.
+
+    Returns:
+        np.ndarray: an array of shape (ceil(w / factor), ceil(h / factor))
+    """
+    w, h = array.shape
+    pooled_w = -(-w // factor)
+    pooled_h = -(-h // factor)
+    padded = np.full((pooled_w * factor, pooled_h * factor), pad_value, dtype=bool)
+    padded[:w, :h] = array
+    return padded.reshape(pooled_w, factor, pooled_h, factor).any(axis=(1, 3))
+
+
+def coarsen_mask(mask: np.ndarray, factor: int) -> np.ndarray:
+    """downsample a mask conservatively for placing on a coarse grid
+
+    A mask placed with its top-left corner anywhere inside a coarse cell covers only pixels within
+    the coarse mask placed at that cell, so a coarse mask fitting at a cell means the mask fits at
+    every position inside the cell.
+
+    Args:
+        mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+        factor (int): the size of the coarse cells in pixels
+
+    Returns:
+        np.ndarray: a 2D boolean array of the coarse cells to be occupied
+    """
+    mask_w, mask_h = mask.shape
+    # the union of the mask at every offset inside a cell
+    footprint_x = np.zeros((mask_w + factor - 1, mask_h), dtype=bool)
+    for dx in range(factor):
+        footprint_x[dx:dx + mask_w] |= mask
+    footprint = np.zeros((mask_w + factor - 1, mask_h + factor - 1), dtype=bool)
+    for dy in range(factor):
+        footprint[:, dy:dy + mask_h] |= footprint_x
+    return max_pool(footprint, factor)
+
+
+class OccupancyGrid():
+    """a boolean map of the occupied canvas pixels backed by a NumPy array
+
+    The map is indexed by `[x, y]`, the same way as `CanvasBase.map_occupied`.
+    Sprite masks are boolean arrays indexed by `[x, y]` as well, placed on the
+    canvas by the position of their top-left corner.
+
+    After `snapshot`, the pixels under each stamp are recorded in a journal, so that `rollback` restores
+    only the regions stamped since the snapshot instead of copying the whole map again.
+    """
+
+    def __init__(self, map_occupied):
+        """
+        Args:
+            map_occupied: a 2D array of whether each pixel in the canvas is occupied or not, copied on creation
+        """
+        self.map = np.array(map_occupied, dtype=bool)
+        self.w, self.h = self.map.shape
+        self._sat = None
+        self._journal = None  # list of (x, y, the map window before stamping), None if not recording
+
+    @property
+    def sat(self) -> np.ndarray:
+        """the summed-area table of the map, recalculated lazily after stamping"""
+        if (self._sat is None):
+            self._sat = calculate_summed_area_table(self.map)
+        return self._sat
+
+    def count_occupied(self, x0, y0, x1, y1):
+        """count the occupied pixels in rectangles in constant time per rectangle
+
+        Args:
+            x0, y0: the top-left corner of the rectangles, int or np.ndarray
+            x1, y1: the exclusive bottom-right corner of the rectangles, int or np.ndarray
+
+        Returns:
+            the count of occupied pixels in each rectangle
+        """
+        sat = self.sat
+        return sat[x1, y1] - sat[x0, y1] - sat[x1, y0] + sat[x0, y0]
+
+    def check_fit(self, mask: np.ndarray, x: int, y: int) -> bool:
+        """check whether a mask fits on the canvas at the given position
+
+        Args:
+            mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+            x (int): the x of the top-left corner of the mask on the canvas
+            y (int): the y of the top-left corner of the mask on the canvas
+
+        Returns:
+            bool: True if the mask is inside the canvas and overlaps no occupied pixel
+        """
+        mask_w, mask_h = mask.shape
+        if (x < 0 or y < 0 or x + mask_w > self.w or y + mask_h > self.h):
+            return False
+        return not (self.map[x:x + mask_w, y:y + mask_h] & mask).any()
+
+    def check_fit_batch(self, mask: np.ndarray, xs: np.ndarray, ys: np.ndarray, blocks: np.ndarray = None) -> np.ndarray:
+        """check whether a mask fits on the canvas at each of the given positions
+
+        With `blocks` given, the summed-area table first rejects the positions where a solid block
+        of the mask covers an occupied pixel and accepts the ones whose whole window is free,
+        so only the remaining positions need the exact per-pixel test.
+
+        Args:
+            mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+            xs (np.ndarray): the x of the top-left corner of the mask for each position
+            ys (np.ndarray): the y of the top-left corner of the mask for each position
+            blocks (np.ndarray, optional): the solid blocks of the mask from `find_solid_blocks`. Defaults to None.
+
+        Returns:
+            np.ndarray: a boolean array, True where the mask fits
+        """
+        mask_w, mask_h = mask.shape
+        fit = (xs >= 0) & (ys >= 0) & (xs + mask_w <= self.w) & (ys + mask_h <= self.h)
+        index = np.flatnonzero(fit)
+        if (blocks is not None):
+            # reject the positions where a solid block covers an occupied pixel, one block at a time
+            for (block_x0, block_y0, block_x1, block_y1) in blocks:
+                if (len(index) == 0):
+                    break
+                x = xs[index]
+                y = ys[index]
+                blocked = self.count_occupied(x + block_x0, y + block_y0, x + block_x1, y + block_y1) > 0
+                fit[index[blocked]] = False
+                index = index[~blocked]
+            # the whole window is free
+            x = xs[index]
+            y = ys[index]
+            free = self.count_occupied(x, y, x + mask_w, y + mask_h) == 0
+            index = index[~free]
+        if (len(index) > 0):
+            increment('pixel_tests', len(index) * mask.size)
+            view = sliding_window_view(self.map, mask.shape)
+            # a (chunk_size, mask_w, mask_h) stack of canvas windows at a time, within the memory budget
+            chunk_size = max(1, FIT_TEST_BUDGET // mask.size)
+            for start in range(0, len(index), chunk_size):
+                chunk = index[start:start + chunk_size]
+                windows = view[xs[chunk], ys[chunk]]
+                fit[chunk] = ~(windows & mask).any(axis=(1, 2))
+        return fit
+
+    def correlate(self, mask: np.ndarray) -> np.ndarray:
+        """count the occupied pixels under a mask for every position of the mask inside the canvas at once,
+        by cross-correlating the mask with the map through FFT
+
+        Args:
+            mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+
+        Returns:
+            np.ndarray: an array of shape (w - mask_w + 1, h - mask_h + 1), where `[x, y]` is the count of occupied pixels
+            under the mask with its top-left corner at (x, y); empty if the mask is larger than the canvas
+        """
+        mask_w, mask_h = mask.shape
+        if (mask_w > self.w or mask_h > self.h):
+            return np.zeros((0, 0), dtype=np.int64)
+        # the circular correlation does not wrap around for positions keeping the mask inside the canvas
+        spectrum = np.fft.rfft2(self.map, s=(self.w, self.h)) * np.conj(np.fft.rfft2(mask, s=(self.w, self.h)))
+        overlap = np.fft.irfft2(spectrum, s=(self.w, self.h))[:self.w - mask_w + 1, :self.h - mask_h + 1]
+        return np.rint(overlap).astype(np.int64)
+
+    def stamp(self, mask: np.ndarray, x: int, y: int):
+        """mark the pixels of a mask as occupied
+
+        Args:
+            mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+            x (int): the x of the top-left corner of the mask on the canvas
+            y (int): the y of the top-left corner of the mask on the canvas
+        """
+        mask_w, mask_h = mask.shape
+        if (self._journal is not None):
+            self._journal.append((x, y, self.map[x:x + mask_w, y:y + mask_h].copy()))
+        self.map[x:x + mask_w, y:y + mask_h] |= mask
+        self._sat = None
+
+    def snapshot(self) -> int:
+        """start recording stamps, for rolling back to the current state
+
+        Returns:
+            int: the snapshot to pass to `rollback`
+        """
+        if (self._journal is None):
+            self._journal = []
+        return len(self._journal)
+
+    def rollback(self, snapshot: int) -> list[tuple[int, int, int, int]]:
+        """restore the pixels stamped since a snapshot
+
+        Args:
+            snapshot (int): the snapshot of `snapshot`
+
+        Returns:
+            list[tuple[int, int, int, int]]: the restored regions, each is (x0, y0, x1, y1) with exclusive ends
+        """
+        list_region = []
+        while (len(self._journal) > snapshot):
+            x, y, window = self._journal.pop()
+            window_w, window_h = window.shape
+            self.map[x:x + window_w, y:y + window_h] = window
+            list_region.append((x, y, x + window_w, y + window_h))
+        if (snapshot == 0):
+            self._journal = None
+        if (list_region):
+            self._sat = None
+        return list_region
+
+
+class CoarseOccupancyGrid():
+    """an occupancy grid together with a max-pooled copy of it, for searching coarse cells before pixels
+
+    A coarse cell is occupied if any of its pixels is occupied or outside the canvas, so the coarse grid
+    never reports a fit that the full-resolution grid would reject.
+    """
+
+    def __init__(self, map_occupied, factor: int = None):
+        """
+        Args:
+            map_occupied: a 2D array of whether each pixel in the canvas is occupied or not, copied on creation
+            factor (int, optional): the size of the coarse cells in pixels. Defaults to the smallest size keeping
+                the coarse grid within `COARSE_GRID_SIZE` cells along each axis.
+        """
+        self.fine = OccupancyGrid(map_occupied)
+        if (factor is None):
+            factor = max(1, -(-max(self.fine.w, self.fine.h) // COARSE_GRID_SIZE))
+        self.factor = factor
+        self.coarse = OccupancyGrid(max_pool(self.fine.map, factor, pad_value=True))
+
+    def stamp(self, mask: np.ndarray, x: int, y: int):
+        """mark the pixels of a mask as occupied on both grids
+
+        Args:
+            mask (np.ndarray): a 2D boolean array of the pixels to be occupied
+            x (int): the x of the top-left corner of the mask on the canvas
+            y (int): the y of the top-left corner of the mask on the canvas
+        """
+        self.fine.stamp(mask, x, y)
+        mask_w, mask_h = mask.shape
+        self.update_coarse(x, y, x + mask_w, y + mask_h)
+
+    def snapshot(self) -> int:
+        """start recording stamps, see `OccupancyGrid.snapshot`"""
+        return self.fine.snapshot()
+
+    def rollback(self, snapshot: int) -> list[tuple[int, int, int, int]]:
+        """restore the pixels stamped since a snapshot on both grids, see `OccupancyGrid.rollback`"""
+        list_region = self.fine.rollback(snapshot)
+        for region in list_region:
+            self.update_coarse(*region)
+        return list_region
+
+    def update_coarse(self, x0: int, y0: int, x1: int, y1: int):
+        """pool again the coarse cells covering a region of the full-resolution grid
+
+        Args:
+            x0, y0: the top-left corner of the region
+            x1, y1: the exclusive bottom-right corner of the region
+        """
+        factor = self.factor
+        cell_x0 = x0 // factor
+        cell_y0 = y0 // factor
+        cell_x1 = -(-x1 // factor)
+        cell_y1 = -(-y1 // factor)
+        self.coarse.map[cell_x0:cell_x1, cell_y0:cell_y1] = max_pool(
+            self.fine.map[cell_x0 * factor:cell_x1 * factor, cell_y0 * factor:cell_y1 * factor], factor, pad_value=True)
+        self.coarse._sat = None
+
+
+class CandidateIndex():
+    """canvas pixels in the order of their distance to the canvas center, skipping occupied pixels lazily
+
+    Occupied pixels are looked up in the occupancy grid while iterating rather than removed from the list,
+    and the occupied pixels at the head of the list are skipped once for good.
+    """
+
+    def __init__(self, list_canvas_pix, grid: OccupancyGrid):
+        """
+        Args:
+            list_canvas_pix: a list of tuple (x,y) or an array of shape (n, 2) sorted by its distance to the canvas center
+            grid (OccupancyGrid): the occupancy of the canvas
+        """
+        pix = np.asarray(list_canvas_pix, dtype=np.int32).reshape(-1, 2)
+        self.xs = pix[:, 0]
+        self.ys = pix[:, 1]
+        self.grid = grid
+        # all pixels before `start` are occupied
+        self.start = 0
+
+    def __len__(self):
+        return len(self.xs)
+
+    def iter_batches(self, batch_size: int = 16, max_batch_size: int = 4096):
+        """iterate over the unoccupied pixels in order, a growing batch at a time
+
+        Args:
+            batch_size (int, optional): the size of the first batch, doubled for each next batch. Defaults to 16.
+            max_batch_size (int, optional): the maximum size of a batch. Defaults to 4096.
+
+        Yields:
+            (xs, ys): arrays of the x and y of unoccupied pixels
+        """
+        pos = self.start
+        while (pos < len(self.xs)):
+            xs = self.xs[pos:pos + batch_size]
+            ys = self.ys[pos:pos + batch_size]
+            free = ~self.grid.map[xs, ys]
+            if (pos == self.start):
+                # resume from the first unoccupied pixel next time
+                self.start += int(free.argmax()) if free.any() else len(free)
+            pos += batch_size
+            batch_size = min(batch_size * 2, max_batch_size)
+            if (free.any()):
+                yield xs[free], ys[free]
@@ -1,12 +1,18 @@
-import os
 from PIL import Image
-import copy
 import math
-import collections
-from .config import parent_dir
+import bisect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import numpy as np
 from .canvas import CanvasBase
+from .occupancy import OccupancyGrid, CoarseOccupancyGrid, CandidateIndex, find_solid_blocks, coarsen_mask
+from .sprite import Sprite, prepare_sprite
+from .cache import SpriteCache, ResultCache, sprite_cache
+from .metrics import span, increment, timed
 
 from .emoji import EmojiItem
+from .layout import Placement, Layout
 from .util import *
 
 
@@ -21,25 +27,24 @@ def resize_img_based_weight(im: Image.Image, weight: float) -> Image.Image:
     Returns:
         im_resize (2D list): the image in 2D array with each cell of RGBA: the image width
     """
-    width, height = im.getdata().size
-    width_resize = int(width*weight) if int(width*weight) > 0 else 1
-    height_resize = int(height*weight) if int(height*weight) > 0 else 1
-    im_resize = im.resize((width_resize, height_resize), Image.LANCZOS)
+    im_resize = im.resize(calculate_resized_size(im.size, weight), Image.LANCZOS)
     return im_resize
 
 
-class OrderedSet(collections.abc.Set):
-    def __init__(self, iterable=()):
-        self.d = collections.OrderedDict.fromkeys(iterable)
+def calculate_resized_size(size: tuple[int, int], weight: float) -> tuple[int, int]:
+    """calculate the size of an image resized based on its weight
 
-    def __len__(self):
-        return len(self.d)
-
-    def __contains__(self, element):
-        return element in self.d
+    Args:
+        size (tuple[int, int]): the width and height of the image
+        weight (float): weight of the image
 
-    def __iter__(self):
-        return iter(self.d)
+    Returns:
+        (width, height): the resized width and height, at least 1
+    """
+    width, height = size
+    width_resize = int(width*weight) if int(width*weight) > 0 else 1
+    height_resize = int(height*weight) if int(height*weight) > 0 else 1
+    return width_resize, height_resize
 
 
 # @timeit
@@ -75,6 +80,115 @@ def rename_emoji_image_in_unicode(dict_weight: dict[str, int]) -> dict[str, int]
     return dict_rename
 
 
+@dataclass(frozen=True)
+class PlacementPlan:
+    """the part of emoji plotting shared by all relax ratios, computed once per emoji cloud
+
+    Only the zoom ratio changes with the relax ratio, so an attempt only resizes the images.
+    """
+    # emoji images sorted by their weights in a descending order
+    images: tuple[Image.Image, ...]
+    # keys of the images for caching their sprites, see `EmojiItem.sprite_key`
+    keys: tuple[tuple[str, str], ...]
+    # (vendor, unicode) of the emojis in the same order as `images`
+    codes: tuple[tuple[str, str], ...]
+    # normalized weights in the same order as `images`
+    weights: tuple[float, ...]
+    # base areas (width * height) of the images before resizing
+    areas: tuple[int, ...]
+    # the zoom ratio given relax ratio 1
+    zoom_ratio: float
+
+    def resize(self, relax_ratio: float) -> list[Image.Image]:
+        """generate the resized emoji images given a relax ratio
+
+        Args:
+            relax_ratio (float): the ratio >=1, controlling the sparsity of emoji plotting
+
+        Returns: a list of resized Image objects
+        """
+        zoom_ratio = self.zoom_ratio / relax_ratio
+        return [
+            resize_img_based_weight(im, weight * zoom_ratio)
+            for im, weight in zip(self.images, self.weights)
+        ]
+
+    def iter_sprites(self, relax_ratio: float, thold_alpha_bb: float, cache: SpriteCache = sprite_cache, skip=()):
+        """resize and prepare the emoji images given a relax ratio one by one, reusing the cached sprites
+
+        Args:
+            relax_ratio (float): the ratio >=1, controlling the sparsity of emoji plotting
+            thold_alpha_bb (float): the threshold to distinguish white and non-white colors for bounding box detection
+            cache (SpriteCache, optional): the sprite cache. Defaults to the process-wide `sprite_cache`.
+            skip (optional): the indices of the emojis not to prepare, yielding None instead. Defaults to none.
+
+        Yields:
+            Sprite: the prepared emojis in the order of `images`
+        """
+        zoom_ratio = self.zoom_ratio / relax_ratio
+        for index, (im, key, weight) in enumerate(zip(self.images, self.keys, self.weights)):
+            if (index in skip):
+                yield None
+                continue
+            size = calculate_resized_size(im.size, weight * zoom_ratio)
+            yield get_resized_sprite(im, key, size, thold_alpha_bb, cache)
+
+
+def get_resized_sprite(im: Image.Image, key, size: tuple[int, int], thold_alpha_bb: float, cache: SpriteCache = sprite_cache) -> Sprite:
+    """resize and prepare an emoji image, reusing the cached sprite
+
+    Args:
+        im (Image.Image): the original emoji image
+        key: the key of the image, see `EmojiItem.sprite_key`, None to skip the cache
+        size (tuple[int, int]): the size of the resized image
+        thold_alpha_bb (float): the threshold to distinguish white and non-white colors for bounding box detection
+        cache (SpriteCache, optional): the sprite cache. Defaults to the process-wide `sprite_cache`.
+
+    Returns:
+        Sprite: the prepared emoji
+    """
+    def create_sprite():
+        with span('resize'):
+            im_resize = im.resize(size, Image.LANCZOS)
+        return prepare_sprite(im_resize, thold_alpha_bb)
+
+    sprite_key = None if key is None else key + (size, thold_alpha_bb)
+    return cache.get_or_create(sprite_key, create_sprite)
+
+
+def create_placement_plan(emoji_list: list[EmojiItem], canvas_area: float) -> PlacementPlan:
+    """normalize emoji weights and calculate the zoom ratio for a canvas, without modifying the emoji items
+
+    Args:
+        emoji_list (list[EmojiItem]): a list of valid EmojiItem objects
+        canvas_area (float): the canvas area
+
+    Returns:
+        PlacementPlan: the plan shared by all relax ratios
+    """
+    weight_sum = sum([e.weight for e in emoji_list])
+    list_norm_weight = [e.weight / weight_sum for e in emoji_list]
+    list_area = []
+    norm_area_sum = 0
+    for e, norm_weight in zip(emoji_list, list_norm_weight):
+        width, height = e.image.size
+        s = width * height
+        list_area.append(s)
+        norm_area_sum += s * norm_weight ** 2
+    zoom_ratio = math.sqrt(canvas_area/norm_area_sum)
+
+    # heavier emojis first, emojis of equal weights by their unicode and vendor rather than their order in the list
+    order = sorted(range(len(emoji_list)), key=lambda i: (-list_norm_weight[i], emoji_list[i].unicode, emoji_list[i].vendor))
+    return PlacementPlan(
+        images=tuple(emoji_list[i].image for i in order),
+        keys=tuple(emoji_list[i].sprite_key for i in order),
+        codes=tuple((emoji_list[i].vendor, emoji_list[i].unicode) for i in order),
+        weights=tuple(list_norm_weight[i] for i in order),
+        areas=tuple(list_area[i] for i in order),
+        zoom_ratio=zoom_ratio
+    )
+
+
 def resize_emoji_list(emoji_list: list[EmojiItem], canvas_area: float, relax_ratio: float = 1.5) -> list[Image.Image]:
     """generate the resized emoji images based on weights
 
@@ -85,29 +199,419 @@ def resize_emoji_list(emoji_list: list[EmojiItem], canvas_area: float, relax_rat
 
     Returns: a list of resized Image objects
     """
-    weight_sum = sum([e.weight for e in emoji_list])
-    norm_area_sum = 0
-    size_cache = {}
-    for e in emoji_list:
-        size = e.image.getdata().size
-        if size in size_cache:
-            s = size_cache[size]
+    return create_placement_plan(emoji_list, canvas_area).resize(relax_ratio)
+
+
+def find_position_by_scan(grid: OccupancyGrid, mask: np.ndarray, offset_x: int, offset_y: int, candidates: CandidateIndex) -> tuple[int, int]:
+    """find the first canvas pixel where the emoji fits by checking the unoccupied pixels in order, a growing batch at a time
+
+    Args:
+        grid (OccupancyGrid): the occupancy of the canvas
+        mask (np.ndarray): the opaque mask of the emoji
+        offset_x (int): the offset of the mask's top-left corner to the emoji center on x-axis
+        offset_y (int): the offset of the mask's top-left corner to the emoji center on y-axis
+        candidates (CandidateIndex): the canvas pixels sorted by its distance to the canvas center
+
+    Returns:
+        (x, y): the canvas pixel of the emoji center, None if the emoji fits nowhere
+    """
+    # fully opaque blocks of the mask for rejecting occupied positions early
+    blocks = find_solid_blocks(mask)
+    for xs, ys in candidates.iter_batches():
+        increment('candidates', len(xs))
+        fit = grid.check_fit_batch(mask, xs + offset_x, ys + offset_y, blocks)
+        if (fit.any()):
+            index = int(fit.argmax())
+            return int(xs[index]), int(ys[index])
+    return None
+
+
+def find_position_by_correlation(grid: OccupancyGrid, mask: np.ndarray, offset_x: int, offset_y: int, center_x: int, center_y: int) -> tuple[int, int]:
+    """find the free canvas pixel closest to the canvas center where the emoji fits,
+    checking all pixels at once by cross-correlating the mask with the occupancy map
+
+    Ties in the distance are broken by x and then y, the same order as `CanvasBase.calculate_sorted_canvas_pix_for_plotting`,
+    so the position is the same as the one found by `find_position_by_scan`.
+
+    Args:
+        grid (OccupancyGrid): the occupancy of the canvas
+        mask (np.ndarray): the opaque mask of the emoji
+        offset_x (int): the offset of the mask's top-left corner to the emoji center on x-axis
+        offset_y (int): the offset of the mask's top-left corner to the emoji center on y-axis
+        center_x (int): the x of the canvas center
+        center_y (int): the y of the canvas center
+
+    Returns:
+        (x, y): the canvas pixel of the emoji center, None if the emoji fits nowhere
+    """
+    overlap = grid.correlate(mask)
+    increment('candidates', overlap.size)
+    increment('pixel_tests', overlap.size * mask.size)
+    # emoji center of each position
+    xs = np.arange(overlap.shape[0]) - offset_x
+    ys = np.arange(overlap.shape[1]) - offset_y
+    # the emoji center has to be a free canvas pixel
+    inside_x = (xs >= 0) & (xs < grid.w)
+    inside_y = (ys >= 0) & (ys < grid.h)
+    free = overlap == 0
+    free[~inside_x, :] = False
+    free[:, ~inside_y] = False
+    free[np.ix_(inside_x, inside_y)] &= ~grid.map[np.ix_(xs[inside_x], ys[inside_y])]
+    index_x, index_y = np.nonzero(free)
+    if (len(index_x) == 0):
+        return None
+    x = xs[index_x]
+    y = ys[index_y]
+    dist = (x - center_x) ** 2 + (y - center_y) ** 2
+    best = np.lexsort((y, x, dist))[0]
+    return int(x[best]), int(y[best])
+
+
+def find_position_by_coarse_search(grid: CoarseOccupancyGrid, mask: np.ndarray, offset_x: int, offset_y: int, center_x: int, center_y: int, candidates: CandidateIndex) -> tuple[int, int]:
+    """find a canvas pixel near the canvas center where the emoji fits, searching the coarse grid first
+    and then the pixels around the chosen coarse cell at full resolution
+
+    The coarse cell closest to the canvas center where the coarsened mask fits is chosen, and the emoji is placed at the
+    pixel closest to the canvas center within that cell and its neighbouring cells. The position may differ from the one
+    of `find_position_by_scan`, since the coarse grid rejects cells that are only partly free. If no coarse cell fits,
+    the canvas pixels are scanned at full resolution, so the emoji is placed whenever it fits anywhere.
+
+    Args:
+        grid (CoarseOccupancyGrid): the occupancy of the canvas at both resolutions
+        mask (np.ndarray): the opaque mask of the emoji
+        offset_x (int): the offset of the mask's top-left corner to the emoji center on x-axis
+        offset_y (int): the offset of the mask's top-left corner to the emoji center on y-axis
+        center_x (int): the x of the canvas center
+        center_y (int): the y of the canvas center
+        candidates (CandidateIndex): the canvas pixels sorted by its distance to the canvas center, for the full-resolution scan
+
+    Returns:
+        (x, y): the canvas pixel of the emoji center, None if the emoji fits nowhere
+    """
+    factor = grid.factor
+    overlap = grid.coarse.correlate(coarsen_mask(mask, factor))
+    increment('candidates', overlap.size)
+    cell_x, cell_y = np.nonzero(overlap == 0)
+    if (len(cell_x) > 0):
+        # the emoji center with the mask's top-left corner in the middle of each cell
+        x = (cell_x * factor + (factor - 1) / 2) - offset_x
+        y = (cell_y * factor + (factor - 1) / 2) - offset_y
+        dist = (x - center_x) ** 2 + (y - center_y) ** 2
+        best = np.lexsort((y, x, dist))[0]
+        # the top-left corners within the chosen cell and its neighbours
+        xs, ys = np.meshgrid(
+            np.arange((cell_x[best] - 1) * factor, (cell_x[best] + 2) * factor),
+            np.arange((cell_y[best] - 1) * factor, (cell_y[best] + 2) * factor), indexing='ij')
+        x = xs.ravel() - offset_x
+        y = ys.ravel() - offset_y
+        # the emoji center has to be a free canvas pixel
+        free = (x >= 0) & (x < grid.fine.w) & (y >= 0) & (y < grid.fine.h)
+        free[free] = ~grid.fine.map[x[free], y[free]]
+        x = x[free]
+        y = y[free]
+        increment('candidates', len(x))
+        fit = grid.fine.check_fit_batch(mask, x + offset_x, y + offset_y, find_solid_blocks(mask))
+        if (fit.any()):
+            x = x[fit]
+            y = y[fit]
+            dist = (x - center_x) ** 2 + (y - center_y) ** 2
+            best = np.lexsort((y, x, dist))[0]
+            return int(x[best]), int(y[best])
+    return find_position_by_scan(grid.fine, mask, offset_x, offset_y, candidates)
+
+
+class PlacementStrategy():
+    """how the position of each emoji is searched on the canvas, passed to the plotting functions as `placement`
+
+    The built-in strategies are registered by name in `PLACEMENT_STRATEGIES`, and a strategy object of custom
+    parameters can be passed instead of a name. A strategy is shared by all attempts and may be sent to worker
+    processes, so it keeps no state of an attempt.
+    """
+    # whether `find_position` takes the canvas pixels sorted by their distance to the canvas center
+    uses_canvas_order = True
+
+    def create_grid(self, canvas: CanvasBase):
+        """create the occupancy grid of the canvas, copied from the canvas map
+
+        Args:
+            canvas (CanvasBase): the canvas
+
+        Returns:
+            OccupancyGrid: the grid, stamped with the placed emojis
+        """
+        return OccupancyGrid(canvas.map_occupied)
+
+    def find_position(self, grid, sprite: Sprite, canvas: CanvasBase, candidates: CandidateIndex) -> tuple[int, int]:
+        """find the canvas pixel of the emoji center where an emoji fits
+
+        Args:
+            grid: the occupancy of the canvas from `create_grid`
+            sprite (Sprite): the emoji
+            canvas (CanvasBase): the canvas
+            candidates (CandidateIndex): the unoccupied canvas pixels sorted by their distance to the canvas center,
+                None if not `uses_canvas_order`
+
+        Returns:
+            (x, y): the canvas pixel of the emoji center, None if the emoji fits nowhere
+        """
+        raise NotImplementedError("override `find_position`")
+
+
+@dataclass(frozen=True)
+class ScanPlacement(PlacementStrategy):
+    """check the canvas pixels in the order of their distance to the canvas center, see `find_position_by_scan`"""
+
+    def find_position(self, grid, sprite, canvas, candidates):
+        return find_position_by_scan(grid, sprite.mask, sprite.offset_x, sprite.offset_y, candidates)
+
+
+@dataclass(frozen=True)
+class CorrelatePlacement(PlacementStrategy):
+    """check all canvas pixels at once by FFT, finding the same positions as `ScanPlacement` faster for large emojis,
+    see `find_position_by_correlation`
+    """
+    uses_canvas_order = False
+
+    def find_position(self, grid, sprite, canvas, candidates):
+        return find_position_by_correlation(
+            grid, sprite.mask, sprite.offset_x, sprite.offset_y, canvas.center_x, canvas.center_y)
+
+
+@dataclass(frozen=True)
+class CoarsePlacement(PlacementStrategy):
+    """search a downsampled canvas first and refine around the chosen cell, which is faster for large canvases
+    but packs slightly less densely, see `find_position_by_coarse_search`
+    """
+    # the downsampling factor of the coarse grid, None to fit the canvas into about `COARSE_GRID_SIZE` cells per side
+    factor: int = None
+
+    def create_grid(self, canvas):
+        return CoarseOccupancyGrid(canvas.map_occupied, self.factor)
+
+    def find_position(self, grid, sprite, canvas, candidates):
+        return find_position_by_coarse_search(
+            grid, sprite.mask, sprite.offset_x, sprite.offset_y, canvas.center_x, canvas.center_y, candidates)
+
+
+@dataclass(frozen=True)
+class SpiralPlacement(PlacementStrategy):
+    """try the positions along an Archimedean spiral out of the canvas center, as classic word cloud engines do
+
+    The positions are generated lazily a growing batch at a time, so the canvas pixels are neither listed nor sorted.
+    The spiral is stretched to the aspect ratio of the canvas. The positions get sparser away from the center,
+    so a larger step is faster but packs less densely than `ScanPlacement`.
+    """
+    # the angle between consecutive positions, in radians
+    angular_step: float = 0.1
+    # the distance between consecutive turns along the y-axis, in pixels
+    turn_spacing: float = 4.0
+    uses_canvas_order = False
+
+    def iter_batches(self, w: int, h: int, center_x: int, center_y: int, batch_size: int = 16, max_batch_size: int = 4096):
+        """iterate over the positions of the spiral covering a canvas, a growing batch at a time
+
+        Args:
+            w (int): the canvas width
+            h (int): the canvas height
+            center_x (int): the x of the canvas center
+            center_y (int): the y of the canvas center
+            batch_size (int, optional): the size of the first batch, doubled for each next batch. Defaults to 16.
+            max_batch_size (int, optional): the maximum size of a batch. Defaults to 4096.
+
+        Yields:
+            (xs, ys): arrays of the x and y of the positions, possibly out of the canvas or repeated
+        """
+        aspect = w / h
+        # the radius reaching the canvas corner furthest from the center
+        max_radius = math.hypot(max(center_x, w - center_x) / aspect, max(center_y, h - center_y)) + 1
+        count = math.ceil(max_radius * 2 * math.pi / self.turn_spacing / self.angular_step) + 1
+        start = 0
+        while (start < count):
+            theta = np.arange(start, min(start + batch_size, count)) * self.angular_step
+            radius = theta * self.turn_spacing / (2 * math.pi)
+            yield (np.rint(center_x + aspect * radius * np.cos(theta)).astype(np.int64),
+                   np.rint(center_y + radius * np.sin(theta)).astype(np.int64))
+            start += batch_size
+            batch_size = min(batch_size * 2, max_batch_size)
+
+    def find_position(self, grid, sprite, canvas, candidates):
+        blocks = find_solid_blocks(sprite.mask)
+        for xs, ys in self.iter_batches(grid.w, grid.h, canvas.center_x, canvas.center_y):
+            # the emoji center has to be a free canvas pixel
+            inside = (xs >= 0) & (xs < grid.w) & (ys >= 0) & (ys < grid.h)
+            xs = xs[inside]
+            ys = ys[inside]
+            free = ~grid.map[xs, ys]
+            xs = xs[free]
+            ys = ys[free]
+            increment('candidates', len(xs))
+            fit = grid.check_fit_batch(sprite.mask, xs + sprite.offset_x, ys + sprite.offset_y, blocks)
+            if (fit.any()):
+                index = int(fit.argmax())
+                return int(xs[index]), int(ys[index])
+        return None
+
+
+# the placement strategies by name
+PLACEMENT_STRATEGIES = {
+    'scan': ScanPlacement(),
+    'correlate': CorrelatePlacement(),
+    'coarse': CoarsePlacement(),
+    'spiral': SpiralPlacement(),
+}
+
+
+def get_placement_strategy(placement) -> PlacementStrategy:
+    """get the placement strategy of a `placement` argument
+
+    Args:
+        placement (str or PlacementStrategy): a name of `PLACEMENT_STRATEGIES` or a strategy
+
+    Returns:
+        PlacementStrategy: the strategy
+    """
+    if (isinstance(placement, PlacementStrategy)):
+        return placement
+    if (placement not in PLACEMENT_STRATEGIES):
+        raise ValueError("unknown placement mode: %s" % placement)
+    return PLACEMENT_STRATEGIES[placement]
+
+
+def calculate_canvas_order(canvas: CanvasBase, placement):
+    """get the unoccupied canvas pixels sorted by their distance to the canvas center if the placement strategy uses them
+
+    Args:
+        canvas (CanvasBase): the canvas
+        placement (str or PlacementStrategy): the placement strategy
+
+    Returns:
+        the sorted canvas pixels of `CanvasBase.calculate_sorted_canvas_pix_for_plotting`, None if not used
+    """
+    if (not get_placement_strategy(placement).uses_canvas_order):
+        return None
+    with span('canvas_order'):
+        return canvas.calculate_sorted_canvas_pix_for_plotting()
+
+
+def composite_sprites(img: Image.Image, list_placement: list[tuple[Sprite, int, int]], blend: bool = False) -> Image.Image:
+    """draw placed emojis on a copy of an image, one array write per emoji
+
+    Args:
+        img (Image.Image): the image to draw on, which is not modified
+        list_placement (list[tuple[Sprite, int, int]]): each emoji and the canvas pixel (x, y) of its center,
+            the emoji pixels outside the image are skipped
+        blend (bool, optional): whether to blend the emojis over the image by their alpha values, instead of
+            replacing the image pixels by the opaque emoji pixels, which keeps the hard edges. Defaults to False.
+
+    Returns:
+        Image.Image: the RGBA image with the emojis drawn
+    """
+    # a copy of the image, and its pixels indexed by [y, x] if not blending
+    img = img.convert('RGBA')
+    img_array = None if blend else np.array(img)
+    for sprite, x, y in list_placement:
+        # the part of the emoji within the image
+        x_0 = x + sprite.offset_x
+        y_0 = y + sprite.offset_y
+        x_1 = min(x_0 + sprite.w, img.width)
+        y_1 = min(y_0 + sprite.h, img.height)
+        x_start = max(-x_0, 0)
+        y_start = max(-y_0, 0)
+        if (x_0 + x_start >= x_1 or y_0 + y_start >= y_1):
+            continue
+        rgba = sprite.rgba[x_start:x_1 - x_0, y_start:y_1 - y_0].transpose(1, 0, 2)
+        if (blend):
+            img.alpha_composite(Image.fromarray(np.ascontiguousarray(rgba), 'RGBA'), (x_0 + x_start, y_0 + y_start))
         else:
-            s = size[0] * size[1]
-        norm_weight = e.weight / weight_sum
-        norm_area_sum += s * norm_weight ** 2
-        e.weight = norm_weight
+            mask = sprite.mask[x_start:x_1 - x_0, y_start:y_1 - y_0].T
+            img_array[y_0 + y_start:y_1, x_0 + x_start:x_1][mask] = rgba[mask]
+    if (blend):
+        return img
+    return Image.fromarray(img_array, 'RGBA')
 
-    zoom_ratio = math.sqrt(canvas_area/norm_area_sum) / relax_ratio
 
-    return [
-        resize_img_based_weight(e.image, e.weight * zoom_ratio)
-        for e in sorted(emoji_list, key=lambda e: e.weight, reverse=True)
-    ]
+def create_occupancy_grid(canvas: CanvasBase, placement):
+    """create the occupancy grid of a canvas for a placement strategy, copying the canvas map once
+
+    Args:
+        canvas (CanvasBase): the canvas
+        placement (str or PlacementStrategy): the placement strategy
+
+    Returns:
+        OccupancyGrid or CoarseOccupancyGrid: the grid of `PlacementStrategy.create_grid`
+    """
+    return get_placement_strategy(placement).create_grid(canvas)
+
+
+@timed('attempt')
+def place_emojis_given_relax_ratio(canvas: CanvasBase, list_canvas_pix, thold_alpha_bb: float, relax_ratio: float, placement: str, plan: PlacementPlan, cancel=None, fixed: dict = None, grid=None) -> list[tuple[Sprite, int, int]]:
+    """find the positions of the emojis of a plan one by one, until an emoji fits nowhere
 
+    Args:
+        canvas (CanvasBase): the canvas to place the emojis on, which is not modified
+        list_canvas_pix (list): a list of tuple (x,y) sorted by its distance to the canvas center,
+            calculated if None and used by the placement strategy
+        thold_alpha_bb (float): the threshold to distinguish white and non-white colors for bounding box detection
+        relax_ratio (float): the ratio >=1, controlling the sparsity of emoji plotting
+        placement (str or PlacementStrategy): the placement strategy or its name, see `PlacementStrategy`
+        plan (PlacementPlan): the plan of the emojis on the canvas
+        cancel (callable, optional): a function checked before placing each emoji, returning True to stop placing
+        fixed (dict, optional): key: the index of an emoji in the plan, value: (sprite, x, y) of the emoji placed already,
+            which is kept at its position and stamped before placing the others. Defaults to None.
+        grid (optional): the occupancy of the canvas from `create_occupancy_grid` of the same placement, shared by the attempts of a search and
+            rolled back to its state on return. Defaults to a new grid.
+
+    Returns:
+        list[tuple[Sprite, int, int]]: each placed emoji and the canvas pixel (x, y) of its center, in the order of the plan
+    """
+    strategy = get_placement_strategy(placement)
+    # a shared grid is restored afterwards, only in the regions stamped by this attempt
+    snapshot = None
+    if (grid is None):
+        grid = strategy.create_grid(canvas)
+    else:
+        snapshot = grid.snapshot()
+    try:
+        candidates = None
+        if (strategy.uses_canvas_order):
+            if (list_canvas_pix is None):
+                list_canvas_pix = calculate_canvas_order(canvas, strategy)
+            # canvas pixels skipping the occupied ones as emojis are plotted, on the full-resolution grid of a coarse grid
+            candidates = CandidateIndex(list_canvas_pix, grid.fine if isinstance(grid, CoarseOccupancyGrid) else grid)
+        increment('attempts')
+        if (fixed is None):
+            fixed = {}
+        for sprite, x, y in fixed.values():
+            grid.stamp(sprite.mask, x + sprite.offset_x, y + sprite.offset_y)
+
+        list_placement = []
+        for index, sprite in enumerate(plan.iter_sprites(relax_ratio, thold_alpha_bb, skip=fixed)):
+            if (index in fixed):
+                list_placement.append(fixed[index])
+                continue
+            # the attempt is no longer needed
+            if (cancel is not None and cancel()):
+                break
+            # find a position near the canvas center where the emoji fits
+            with span('search'):
+                position = strategy.find_position(grid, sprite, canvas, candidates)
 
-@timeit
-def plot_emoji_cloud_given_relax_ratio(emoji_list: list[EmojiItem], canvas: CanvasBase, list_canvas_pix, thold_alpha_bb: float, relax_ratio: float) -> tuple[Image.Image, int]:
+            # fail to plot the emoji image
+            if (position is None):
+                break
+
+            canvas_x, canvas_y = position
+            with span('stamp'):
+                grid.stamp(sprite.mask, canvas_x + sprite.offset_x, canvas_y + sprite.offset_y)
+            list_placement.append((sprite, canvas_x, canvas_y))
+        increment('emojis_plotted', len(list_placement))
+        return list_placement
+    finally:
+        if (snapshot is not None):
+            grid.rollback(snapshot)
+
+
+def plot_emoji_cloud_given_relax_ratio(emoji_list: list[EmojiItem], canvas: CanvasBase, list_canvas_pix, thold_alpha_bb: float, relax_ratio: float, placement: str = 'scan', plan: PlacementPlan = None, cancel=None, blend: bool = False) -> tuple[Image.Image, int]:
     """plot emoji cloud
 
     Args:
@@ -122,100 +626,29 @@ def plot_emoji_cloud_given_relax_ratio(emoji_list: list[EmojiItem], canvas: Canv
         dict_customized (dict): key: emoji image name in unicode, value: the path of customized emoji image
         thold_alpha_bb: the threshold to distinguish white and non-white colors for bounding box detection 
         relax_ratio (float): the ratio >=1, controlling the sparsity of emoji plotting
+        placement (str or PlacementStrategy, optional): 'scan' to check the canvas pixels one batch at a time, or 'correlate'
+            to check all canvas pixels at once by FFT, which is faster for large emojis. Both find the same positions. 'coarse'
+            to search a downsampled canvas first and refine around the chosen cell, which is faster for large canvases but
+            packs slightly less densely, see `find_position_by_coarse_search`. 'spiral' to walk an Archimedean spiral out of
+            the canvas center, which needs no sorted canvas pixels but packs less densely, see `SpiralPlacement`.
+            Or a `PlacementStrategy` object. Defaults to 'scan'.
+        plan (PlacementPlan, optional): the plan of `emoji_list` on the canvas, created from `emoji_list` if not given
+        cancel (callable, optional): a function checked before plotting each emoji, returning True to stop plotting
+        blend (bool, optional): whether to blend the emojis over the canvas, see `composite_sprites`. Defaults to False.
 
     Returns:
         canvas_img: the final image of canvas
         count_plot: the count of plotted emojis 
     """
-    # new_list_canvas_pix = list_canvas_pix.copy()
-    new_list_canvas_pix = copy.deepcopy(list_canvas_pix)
-    # new_canvas_img = canvas_img.copy()
-    new_canvas_img = copy.deepcopy(canvas.img)
-    # new_map_occupied = map_occupied.copy()
-    new_map_occupied = copy.deepcopy(canvas.map_occupied)
-
-    list_sorted_emoji = resize_emoji_list(emoji_list, canvas.area, relax_ratio) 
-
-    # plot each emoji
-    count_plot = 0
-    for index, im in enumerate(list_sorted_emoji):
-        # fail to plot the last emoji image
-        if (index != count_plot):
-            break
-        # remove pixel outside bounding box
-        img_within_bb = remove_pixel_outside_bb(im, thold_alpha_bb)
-        # parse emoji image
-        dict_opacity = parse_image_by_array(img_within_bb)
-
-        # get the center point of the emoji image
-        list_x = []
-        list_y = []
-        for (x, y) in dict_opacity:
-            list_x.append(x)
-            list_y.append(y)
-        center = sum(list_x)/len(list_x), sum(list_y)/len(list_y)
-        img_center_x = int(center[0])
-        img_center_y = int(center[1])
-
-        # sort opacity point by distant to the center point
-        dict_dist_img_center = {}  # key: point, value: point to the image center
-        for (x, y) in dict_opacity:
-            # dist = distance_between_two_points(x, y, img_width/2, img_height/2)
-            dist = distance_between_two_points(
-                x, y, img_center_x, img_center_y)
-            dict_dist_img_center[(x, y)] = dist
-        list_img_pix_dist = sort_dictionary_by_value(
-            dict_dist_img_center, reverse=True)
-        list_img_pix = [x_y for (x_y, dist) in list_img_pix_dist]
-
-        # check the possibility of each pixel starting from the center
-        for x_y in new_list_canvas_pix:
-            canvas_x, canvas_y = x_y
-            # check all points
-            flag = True
-            for (x, y) in list_img_pix:
-                # adding offset
-                offset_x = x - img_center_x
-                offset_y = y - img_center_y
-                # candidate x, y on canvas
-                candidate_x = canvas_x + offset_x
-                candidate_y = canvas_y + offset_y
-                # check validity
-                if (candidate_x < canvas.w and candidate_x >= 0 and candidate_y < canvas.h and candidate_y >= 0):
-                    # the pixel on canvas has been occupied
-                    if (new_map_occupied[canvas_x + offset_x][canvas_y + offset_y] == 1):
-                        flag = False
-                        break
-                # out of the canvas
-                else:
-                    flag = False
-                    break
-            # plot emoji image
-            if (flag):
-                list_occupied = []
-                for (x, y) in dict_opacity:
-                    # adding offset
-                    offset_x = x - img_center_x
-                    offset_y = y - img_center_y
-                    # candidate x, y on canvas
-                    candidate_x = canvas_x + offset_x
-                    candidate_y = canvas_y + offset_y
-                    # plot the emoji
-                    new_canvas_img.putpixel(
-                        (candidate_x, candidate_y), dict_opacity[(x, y)])
-                    new_map_occupied[candidate_x][candidate_y] = 1
-                    list_occupied.append((candidate_x, candidate_y))
-                # continue processing the next emoji
-                count_plot += 1
-                break
-            else:
-                list_occupied = []
-
-        # remove occupied tuple
-        new_list_canvas_pix = list(OrderedSet(
-            new_list_canvas_pix) - OrderedSet(list_occupied))
-    return new_canvas_img, count_plot
-
+    if (plan is None):
+        with span('load'):
+            plan = create_placement_plan(emoji_list, canvas.area)
+    # plot each emoji, drawn on the canvas at once after all positions are found
+    list_placement = place_emojis_given_relax_ratio(
+        canvas, list_canvas_pix, thold_alpha_bb, relax_ratio, placement, plan, cancel)
+    with span('composite'):
+        new_canvas_img = composite_sprites(canvas.img, list_placement, blend)
+    return new_canvas_img, len(list_placement)
 
 
 # @timeit
@@ -371,15 +804,394 @@ def plot_emoji_cloud_given_relax_ratio(emoji_list: list[EmojiItem], canvas: Canv
 #     return new_canvas_img, count_plot
 
 
-@timeit
-def plot_dense_emoji_cloud(canvas: CanvasBase, emoji_list: list[EmojiItem], thold_alpha_bb: int = 4, num_try: int = 20, step_size: float = 0.1) -> Image.Image:
-    # a sorted list of available pixel positions for plotting
-    list_canvas_pix = canvas.calculate_sorted_canvas_pix_for_plotting()
-    # plot emoji cloud with an increasing relax_ratio with a fixed step size
-    for i in range(num_try):
-        relax_ratio = 1 + step_size*i
-        canvas_img_plot, count_plot = plot_emoji_cloud_given_relax_ratio(
-            emoji_list, canvas, list_canvas_pix, thold_alpha_bb, relax_ratio)
-        # plot all emojis successfully
-        if (count_plot == len(emoji_list)):
-            return canvas_img_plot
+# state of a worker process placing emojis of relax ratios in parallel, set up once by `_init_relax_ratio_worker`
+_worker_state = None
+
+
+def _init_relax_ratio_worker(canvas, list_canvas_pix, plan, thold_alpha_bb, placement, best_index):
+    global _worker_state
+    grid = create_occupancy_grid(canvas, placement)
+    _worker_state = (canvas, list_canvas_pix, plan, thold_alpha_bb, placement, best_index, grid)
+
+
+def _place_relax_ratio_in_worker(index: int, relax_ratio: float) -> tuple[int, list[tuple[int, int]]]:
+    canvas, list_canvas_pix, plan, thold_alpha_bb, placement, best_index, grid = _worker_state
+    # a lower relax ratio has succeeded already
+    cancel = lambda: best_index.value < index
+    list_placement = place_emojis_given_relax_ratio(
+        canvas, list_canvas_pix, thold_alpha_bb, relax_ratio, placement, plan, cancel, grid=grid)
+    if (len(list_placement) == len(plan.images)):
+        # the positions only, the sprites are prepared again by the caller instead of being sent back
+        return index, [(x, y) for sprite, x, y in list_placement]
+    return index, None
+
+
+def place_relax_ratios_in_parallel(canvas: CanvasBase, list_canvas_pix, plan: PlacementPlan, thold_alpha_bb: int, list_relax_ratio: list[float], placement: str = 'scan', num_worker: int = None) -> tuple[float, list[tuple[Sprite, int, int]]]:
+    """place the emojis of several relax ratios at once on a process pool, and return the placements of the lowest
+    relax ratio placing all emojis, the same as trying the relax ratios one by one
+
+    The canvas, canvas pixels and plan are sent to each worker once. Once a relax ratio succeeds,
+    the attempts of higher relax ratios are dropped if not started yet and stopped at the next emoji if running.
+
+    Args:
+        canvas (CanvasBase): the canvas to place the emojis on
+        list_canvas_pix (list): a list of tuple (x,y) sorted by its distance to the canvas center
+        plan (PlacementPlan): the plan of the emojis on the canvas
+        thold_alpha_bb (int): the threshold to distinguish white and non-white colors for bounding box detection
+        list_relax_ratio (list[float]): relax ratios in an increasing order
+        placement (str or PlacementStrategy, optional): the placement strategy, 'scan', 'correlate', 'coarse' or 'spiral',
+            see `plot_emoji_cloud_given_relax_ratio`. Defaults to 'scan'.
+        num_worker (int, optional): the number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        (relax_ratio, list_placement): the relax ratio and the placements of `place_emojis_given_relax_ratio`,
+            None if no relax ratio fits all emojis
+    """
+    ctx = multiprocessing.get_context()
+    # index of the lowest relax ratio that succeeded so far
+    best_index = ctx.Value('i', len(list_relax_ratio))
+    dict_result = {}  # key: index of relax ratio, value: the positions of the emojis or None
+    with ProcessPoolExecutor(max_workers=num_worker, mp_context=ctx, initializer=_init_relax_ratio_worker,
+                             initargs=(canvas, list_canvas_pix, plan, thold_alpha_bb, placement, best_index)) as executor:
+        dict_future = {
+            executor.submit(_place_relax_ratio_in_worker, index, relax_ratio): index
+            for index, relax_ratio in enumerate(list_relax_ratio)
+        }
+        for future in as_completed(dict_future):
+            if (future.cancelled()):
+                continue
+            index, list_position = future.result()
+            dict_result[index] = list_position
+            if (list_position is not None and index < best_index.value):
+                best_index.value = index
+                # drop the attempts of higher relax ratios not started yet
+                for f, i in dict_future.items():
+                    if (i > index):
+                        f.cancel()
+            # all lower relax ratios have failed
+            if (all(i in dict_result for i in range(min(best_index.value + 1, len(list_relax_ratio))))):
+                break
+        executor.shutdown(cancel_futures=True)
+    list_position = dict_result.get(best_index.value)
+    if (list_position is None):
+        return None
+    relax_ratio = list_relax_ratio[best_index.value]
+    list_sprite = plan.iter_sprites(relax_ratio, thold_alpha_bb)
+    return relax_ratio, [(sprite, x, y) for sprite, (x, y) in zip(list_sprite, list_position)]
+
+
+def plot_relax_ratios_in_parallel(canvas: CanvasBase, list_canvas_pix, plan: PlacementPlan, thold_alpha_bb: int, list_relax_ratio: list[float], placement: str = 'scan', num_worker: int = None, blend: bool = False) -> Image.Image:
+    """plot emoji clouds of several relax ratios at once on a process pool, and return the one of the lowest relax ratio
+    plotting all emojis, see `place_relax_ratios_in_parallel`
+
+    Args:
+        canvas (CanvasBase): the canvas to plot on
+        list_canvas_pix (list): a list of tuple (x,y) sorted by its distance to the canvas center
+        plan (PlacementPlan): the plan of the emojis on the canvas
+        thold_alpha_bb (int): the threshold to distinguish white and non-white colors for bounding box detection
+        list_relax_ratio (list[float]): relax ratios in an increasing order
+        placement (str or PlacementStrategy, optional): the placement strategy, 'scan', 'correlate', 'coarse' or 'spiral',
+            see `plot_emoji_cloud_given_relax_ratio`. Defaults to 'scan'.
+        num_worker (int, optional): the number of worker processes. Defaults to the number of CPUs.
+        blend (bool, optional): whether to blend the emojis over the canvas, see `composite_sprites`. Defaults to False.
+
+    Returns:
+        Image.Image: the emoji cloud, None if no relax ratio fits all emojis
+    """
+    result = place_relax_ratios_in_parallel(
+        canvas, list_canvas_pix, plan, thold_alpha_bb, list_relax_ratio, placement, num_worker)
+    if (result is None):
+        return None
+    return composite_sprites(canvas.img, result[1], blend)
+
+
+def search_dense_placement(canvas: CanvasBase, plan: PlacementPlan, list_canvas_pix, thold_alpha_bb: int = 4, num_try: int = 20, step_size: float = 0.1, placement: str = 'scan', search: str = 'linear', tolerance: float = None, num_worker: int = None) -> tuple[float, list[tuple[Sprite, int, int]]]:
+    """find the lowest relax ratio among 1, 1 + step_size, ..., 1 + step_size*(num_try-1) placing all emojis of a plan
+
+    Args:
+        canvas (CanvasBase): the canvas to place the emojis on
+        plan (PlacementPlan): the plan of the emojis on the canvas
+        list_canvas_pix (list): a list of tuple (x,y) sorted by its distance to the canvas center
+        thold_alpha_bb, num_try, step_size, placement, search, tolerance, num_worker: see `plot_dense_emoji_cloud`
+
+    Returns:
+        (relax_ratio, list_placement): the relax ratio and the placements of `place_emojis_given_relax_ratio`,
+            None if no relax ratio fits all emojis
+    """
+    if (search not in ('linear', 'bisect', 'parallel')):
+        raise ValueError("unknown search strategy: %s" % search)
+
+    if (search == 'parallel'):
+        list_relax_ratio = [1 + step_size*i for i in range(num_try)]
+        return place_relax_ratios_in_parallel(
+            canvas, list_canvas_pix, plan, thold_alpha_bb, list_relax_ratio, placement, num_worker)
+
+    # one grid shared by all tries, each try rolling back its own stamps
+    grid = create_occupancy_grid(canvas, placement)
+
+    def place_given_relax_ratio(relax_ratio):
+        list_placement = place_emojis_given_relax_ratio(
+            canvas, list_canvas_pix, thold_alpha_bb, relax_ratio, placement, plan, grid=grid)
+        # place all emojis successfully
+        if (len(list_placement) == len(plan.images)):
+            return relax_ratio, list_placement
+        return None
+
+    if (search == 'linear'):
+        # place emojis with an increasing relax_ratio with a fixed step size
+        for i in range(num_try):
+            result = place_given_relax_ratio(1 + step_size*i)
+            if (result is not None):
+                return result
+        return None
+
+    # bisect between the densest relax ratio and the sparsest one
+    if (tolerance is None):
+        tolerance = step_size
+    low = 1
+    result = place_given_relax_ratio(low)
+    if (result is not None):
+        return result
+    high = 1 + step_size*(num_try - 1)
+    result = place_given_relax_ratio(high)
+    if (result is None):
+        return None
+    while (high - low > tolerance):
+        relax_ratio = (low + high) / 2
+        result_mid = place_given_relax_ratio(relax_ratio)
+        if (result_mid is not None):
+            high = relax_ratio
+            result = result_mid
+        else:
+            low = relax_ratio
+    return result
+
+
+def make_result_key(kind: str, canvas: CanvasBase, emoji_list: list[EmojiItem], thold_alpha_bb, num_try, step_size, placement, search, tolerance, **kwargs) -> str:
+    """calculate the key of a result of `plot_dense_emoji_cloud` or `layout_dense_emoji_cloud` in a `ResultCache`,
+    the same for the arguments giving the same result
+
+    Returns:
+        str: the key
+    """
+    # a strategy by its name if registered, so a name and its strategy share results
+    strategy = get_placement_strategy(placement)
+    placement = next((name for name, other in PLACEMENT_STRATEGIES.items() if other == strategy), repr(strategy))
+    if (search == 'parallel'):
+        # the same result as 'linear'
+        search = 'linear'
+    if (search != 'bisect'):
+        tolerance = None
+    elif (tolerance is None):
+        tolerance = step_size
+    return ResultCache.make_key(kind, canvas, emoji_list, thold_alpha_bb=thold_alpha_bb, num_try=num_try,
+                                step_size=step_size, placement=placement, search=search, tolerance=tolerance, **kwargs)
+
+
+@timed('plot')
+def plot_dense_emoji_cloud(canvas: CanvasBase, emoji_list: list[EmojiItem], thold_alpha_bb: int = 4, num_try: int = 20, step_size: float = 0.1, placement: str = 'scan', search: str = 'linear', tolerance: float = None, num_worker: int = None, blend: bool = False, cache: ResultCache = None) -> Image.Image:
+    """plot the densest emoji cloud among the relax ratios 1, 1 + step_size, ..., 1 + step_size*(num_try-1)
+
+    The phases and counters of plotting are recorded within `metrics.collect_metrics`.
+
+    Args:
+        canvas (CanvasBase): the canvas to plot on, which is not modified
+        emoji_list (list[EmojiItem]): a list of valid EmojiItem objects
+        thold_alpha_bb (int, optional): the threshold to distinguish white and non-white colors for bounding box detection. Defaults to 4.
+        num_try (int, optional): the number of relax ratios to try. Defaults to 20.
+        step_size (float, optional): the step size between relax ratios. Defaults to 0.1.
+        placement (str or PlacementStrategy, optional): the placement strategy, 'scan', 'correlate', 'coarse' or 'spiral',
+            see `plot_emoji_cloud_given_relax_ratio`. Defaults to 'scan'.
+        search (str, optional): 'linear' to try the relax ratios in an increasing order, 'bisect' to bisect the range
+            of relax ratios down to `tolerance`, which needs far fewer attempts, or 'parallel' to try the relax ratios
+            of 'linear' on a process pool, giving the same result. Defaults to 'linear'.
+        tolerance (float, optional): the precision of the relax ratio found by bisection. Defaults to `step_size`.
+        num_worker (int, optional): the number of worker processes of 'parallel'. Defaults to the number of CPUs.
+        blend (bool, optional): whether to blend the emojis over the canvas by their alpha values instead of drawing
+            their opaque pixels with hard edges. Defaults to False.
+        cache (ResultCache, optional): the cache of emoji clouds to read from and write to. Defaults to None, no caching.
+
+    Returns:
+        Image.Image: the emoji cloud, None if no relax ratio fits all emojis
+    """
+    if (cache is not None):
+        key = make_result_key('image', canvas, emoji_list, thold_alpha_bb, num_try, step_size, placement, search, tolerance, blend=blend)
+        im = cache.get_image(key)
+        if (im is not None):
+            return im
+    # a sorted list of available pixel positions for plotting, if the placement strategy uses it
+    list_canvas_pix = calculate_canvas_order(canvas, placement)
+    # the weights, order and sizes of emojis shared by all relax ratios
+    with span('load'):
+        plan = create_placement_plan(emoji_list, canvas.area)
+    result = search_dense_placement(
+        canvas, plan, list_canvas_pix, thold_alpha_bb, num_try, step_size, placement, search, tolerance, num_worker)
+    if (result is None):
+        return None
+    with span('composite'):
+        im = composite_sprites(canvas.img, result[1], blend)
+    if (cache is not None):
+        cache.put_image(key, im)
+    return im
+
+
+@timed('plot')
+def layout_dense_emoji_cloud(canvas: CanvasBase, emoji_list: list[EmojiItem], thold_alpha_bb: int = 4, num_try: int = 20, step_size: float = 0.1, placement: str = 'scan', search: str = 'linear', tolerance: float = None, num_worker: int = None, cache: ResultCache = None) -> Layout:
+    """place the emojis of the densest emoji cloud like `plot_dense_emoji_cloud`, without drawing them
+
+    The search can run on a small canvas and the layout rendered at a larger scale by `render_layout`.
+
+    Args:
+        canvas (CanvasBase): the canvas to place the emojis on, which is not modified
+        emoji_list (list[EmojiItem]): a list of valid EmojiItem objects
+        thold_alpha_bb, num_try, step_size, placement, search, tolerance, num_worker: see `plot_dense_emoji_cloud`
+        cache (ResultCache, optional): the cache of layouts to read from and write to. Defaults to None, no caching.
+
+    Returns:
+        Layout: the placements of the emojis, None if no relax ratio fits all emojis
+    """
+    if (cache is not None):
+        key = make_result_key('layout', canvas, emoji_list, thold_alpha_bb, num_try, step_size, placement, search, tolerance)
+        layout = cache.get_layout(key)
+        if (layout is not None):
+            return layout
+    list_canvas_pix = calculate_canvas_order(canvas, placement)
+    with span('load'):
+        plan = create_placement_plan(emoji_list, canvas.area)
+    result = search_dense_placement(
+        canvas, plan, list_canvas_pix, thold_alpha_bb, num_try, step_size, placement, search, tolerance, num_worker)
+    if (result is None):
+        return None
+    relax_ratio, list_placement = result
+    zoom_ratio = plan.zoom_ratio / relax_ratio
+    list_record = []
+    for (sprite, x, y), (vendor, unicode), im, weight in zip(list_placement, plan.codes, plan.images, plan.weights):
+        width, height = calculate_resized_size(im.size, weight * zoom_ratio)
+        list_record.append(Placement(unicode, vendor, x, y, weight * zoom_ratio, width, height))
+    layout = Layout(canvas.w, canvas.h, relax_ratio, thold_alpha_bb, tuple(list_record))
+    if (cache is not None):
+        cache.put_layout(key, layout)
+    return layout
+
+
+@timed('update')
+def update_layout(layout: Layout, canvas: CanvasBase, emoji_list: list[EmojiItem], placement: str = 'scan', size_step: float = 0.1, relayout: bool = True, **kwargs) -> Layout:
+    """update a layout for new weights, keeping the emojis whose rank and size bucket have not changed at their positions
+
+    The relax ratio of the layout is kept. An emoji keeps its position and size if the bucket of its scale,
+    `floor(log(scale) / log(1 + size_step))`, is the same, and it keeps its rank relative to the other kept emojis,
+    i.e. the most emojis in the same order as in the layout are kept. The other emojis, including new ones, are placed
+    around the kept ones in the order of their weights, so the time taken grows with the count of changed emojis
+    rather than all emojis.
+
+    Args:
+        layout (Layout): the previous layout on the same canvas
+        canvas (CanvasBase): the canvas of the layout
+        emoji_list (list[EmojiItem]): the emojis with the new weights, emojis missing from the list are removed
+        placement (str or PlacementStrategy, optional): the placement strategy of the changed emojis, see `plot_dense_emoji_cloud`. Defaults to 'scan'.
+        size_step (float, optional): the relative size step between the size buckets. Defaults to 0.1.
+        relayout (bool, optional): whether to search a new layout by `layout_dense_emoji_cloud` if a changed emoji
+            fits nowhere, otherwise return None. Defaults to True.
+        **kwargs: the other arguments of `layout_dense_emoji_cloud` for searching a new layout
+
+    Returns:
+        Layout: the updated layout
+    """
+    def get_bucket(scale):
+        # a bucket of its own for the emojis of zero weight
+        if (scale <= 0):
+            return None
+        return math.floor(math.log(scale) / math.log(1 + size_step))
+
+    list_canvas_pix = calculate_canvas_order(canvas, placement)
+    with span('load'):
+        plan = create_placement_plan(emoji_list, canvas.area)
+    zoom_ratio = plan.zoom_ratio / layout.relax_ratio
+    dict_previous = {(p.vendor, p.unicode): p for p in layout.placements}
+    rank_previous = {(p.vendor, p.unicode): i for i, p in enumerate(layout.placements)}
+    # the emojis of the layout in the same size bucket, in the new order
+    list_index = [
+        index for index, (code, weight) in enumerate(zip(plan.codes, plan.weights))
+        if (code in dict_previous and get_bucket(dict_previous[code].scale) == get_bucket(weight * zoom_ratio))
+    ]
+    # the most of them keeping their previous order, i.e. the longest increasing subsequence of their previous ranks
+    list_tail = []  # the previous ranks ending the increasing subsequences of each length
+    list_tail_index = []  # the positions in `list_index` of `list_tail`
+    list_parent = []  # the position in `list_index` of the previous element of the subsequence ending at each position
+    for i, index in enumerate(list_index):
+        r = rank_previous[plan.codes[index]]
+        length = bisect.bisect_left(list_tail, r)
+        list_parent.append(list_tail_index[length - 1] if length > 0 else None)
+        if (length == len(list_tail)):
+            list_tail.append(r)
+            list_tail_index.append(i)
+        else:
+            list_tail[length] = r
+            list_tail_index[length] = i
+
+    fixed = {}  # key: index in the plan, value: (sprite, x, y)
+    i = list_tail_index[-1] if list_tail_index else None
+    while (i is not None):
+        index = list_index[i]
+        p = dict_previous[plan.codes[index]]
+        sprite = get_resized_sprite(plan.images[index], plan.keys[index], (p.width, p.height), layout.thold_alpha_bb)
+        fixed[index] = (sprite, p.x, p.y)
+        i = list_parent[i]
+
+    list_placement = place_emojis_given_relax_ratio(
+        canvas, list_canvas_pix, layout.thold_alpha_bb, layout.relax_ratio, placement, plan, fixed=fixed)
+    if (len(list_placement) < len(plan.images)):
+        if (not relayout):
+            return None
+        return layout_dense_emoji_cloud(canvas, emoji_list, layout.thold_alpha_bb, placement=placement, **kwargs)
+
+    list_record = []
+    for index, ((sprite, x, y), code, im, weight) in enumerate(zip(list_placement, plan.codes, plan.images, plan.weights)):
+        if (index in fixed):
+            list_record.append(dict_previous[code])
+        else:
+            width, height = calculate_resized_size(im.size, weight * zoom_ratio)
+            list_record.append(Placement(code[1], code[0], x, y, weight * zoom_ratio, width, height))
+    return Layout(canvas.w, canvas.h, layout.relax_ratio, layout.thold_alpha_bb, tuple(list_record))
+
+
+def render_layout(layout: Layout, scale: float = 1, background=None, images: dict = None, blend: bool = False) -> Image.Image:
+    """draw the emojis of a layout at a scale of the canvas, from the original emoji images
+
+    At scale 1, with the canvas image as the background and the same images, the result is the same as
+    the one of `plot_dense_emoji_cloud`.
+
+    Args:
+        layout (Layout): the layout
+        scale (float, optional): the scale of the rendered image to the canvas. Defaults to 1.
+        background (optional): the canvas image, resized to the scale, or a color. Defaults to white.
+        images (dict, optional): key: (vendor, unicode), value: the original emoji image, for emojis not of the vendor images,
+            e.g. `{(e.vendor, e.unicode): e.image for e in emoji_list}`. Defaults to the vendor images.
+        blend (bool, optional): whether to blend the emojis over the background, see `composite_sprites`. Defaults to False.
+
+    Returns:
+        Image.Image: the RGBA image
+    """
+    width = max(int(round(layout.width * scale)), 1)
+    height = max(int(round(layout.height * scale)), 1)
+    if (isinstance(background, Image.Image)):
+        img = background if background.size == (width, height) else background.resize((width, height), Image.LANCZOS)
+    else:
+        img = Image.new('RGBA', (width, height), color='white' if background is None else background)
+
+    list_placement = []
+    for p in layout.placements:
+        code = (p.vendor, p.unicode)
+        if (images is not None and code in images):
+            im, key = images[code], None
+        else:
+            e = EmojiItem(p.unicode, 1, p.vendor)
+            im, key = e.image, e.sprite_key
+        if (scale == 1):
+            size = (p.width, p.height)
+        else:
+            size = calculate_resized_size(im.size, p.scale * scale)
+        sprite = get_resized_sprite(im, key, size, layout.thold_alpha_bb)
+        list_placement.append((sprite, int(round(p.x * scale)), int(round(p.y * scale))))
+    with span('composite'):
+        return composite_sprites(img, list_placement, blend)
@@ -0,0 +1,312 @@
+import io
+import os
+import sys
+import json
+import asyncio
+import argparse
+import collections
+from concurrent.futures import Executor, ProcessPoolExecutor
+from timeit import default_timer as timer
+
+from .batch import RenderJob, JobError, plot_job, _init_batch_worker
+from .metrics import MetricsCollector, Span
+
+
+class ServerBusy(Exception):
+    """a request rejected because the queue of the server is full"""
+
+
+def render_png(request: dict) -> bytes:
+    """plot the emoji cloud of a request and encode it as PNG, in the current process
+
+    Args:
+        request (dict): the fields of `RenderJob.from_dict`, "output" being ignored
+
+    Returns:
+        bytes: the PNG file
+    """
+    im, count = plot_job(RenderJob.from_dict(dict(request, output=None)))
+    f = io.BytesIO()
+    im.save(f, 'PNG')
+    return f.getvalue()
+
+
+class RenderServer():
+    """an asyncio front end of emoji cloud rendering, which runs the blocking renders on an executor
+
+    Identical requests arriving while one of them is rendering share its result. At most `max_concurrency` renders
+    are sent to the executor at once, the others wait in a queue, and requests beyond `max_queue` waiting or
+    rendering are rejected with `ServerBusy` rather than piling up.
+
+    Latencies are recorded in `metrics` as spans:
+    * `request` - from the arrival of a request to its response, including coalesced requests
+    * `queue` - waiting for a free executor slot
+    * `render` - rendering on the executor
+
+    and counters `requests`, `coalesced`, `rejected` and `errors`.
+    """
+
+    def __init__(self, executor: Executor = None, max_concurrency: int = None, max_queue: int = None, num_worker: int = None, list_vendor: list[str] = (), history: int = 1000):
+        """
+        Args:
+            executor (Executor, optional): the executor of the renders, not shut down by `close`. Defaults to a process pool
+                created by the server, whose workers index `list_vendor` once.
+            max_concurrency (int, optional): the maximum count of renders on the executor at once. Defaults to `num_worker`.
+            max_queue (int, optional): the maximum count of distinct requests waiting or rendering. Defaults to 4 times `max_concurrency`.
+            num_worker (int, optional): the number of worker processes of the server's process pool. Defaults to the number of CPUs.
+            list_vendor (list[str], optional): the vendors to index in each worker of the server's process pool. Defaults to none.
+            history (int, optional): the count of recent request latencies kept for percentiles. Defaults to 1000.
+        """
+        if (num_worker is None):
+            num_worker = os.cpu_count() or 1
+        self._own_executor = executor is None
+        if (executor is None):
+            executor = ProcessPoolExecutor(max_workers=num_worker, initializer=_init_batch_worker, initargs=(tuple(list_vendor),))
+        self.executor = executor
+        if (max_concurrency is None):
+            max_concurrency = num_worker
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue if max_queue is not None else max_concurrency * 4
+        self.metrics = MetricsCollector()
+        self._semaphore = None
+        self._inflight = {}  # key: the canonical JSON of a request, value: asyncio.Task rendering its PNG
+        self._latencies = collections.deque(maxlen=history)
+
+    @property
+    def queue_depth(self) -> int:
+        """the count of distinct requests waiting or rendering"""
+        return len(self._inflight)
+
+    async def render(self, request: dict) -> bytes:
+        """render a request, sharing the render of an identical request in flight
+
+        Args:
+            request (dict): the fields of `RenderJob.from_dict`
+
+        Raises:
+            ServerBusy: if the queue is full
+            JobError: if the request cannot be plotted
+
+        Returns:
+            bytes: the PNG file of the emoji cloud
+        """
+        start = timer()
+        self.metrics.increment('requests')
+        key = json.dumps(request, sort_keys=True)
+        task = self._inflight.get(key)
+        try:
+            if (task is not None):
+                self.metrics.increment('coalesced')
+            else:
+                if (len(self._inflight) >= self.max_queue):
+                    self.metrics.increment('rejected')
+                    raise ServerBusy("the render queue is full (%d requests)" % len(self._inflight))
+                # a task of its own, so cancelling any of the clients does not cancel the render of the others
+                task = self._inflight[key] = asyncio.ensure_future(self._render(request))
+                task.add_done_callback(lambda task: self._finish(key, task))
+            return await asyncio.shield(task)
+        except JobError:
+            self.metrics.increment('errors')
+            raise
+        finally:
+            self._record('request', start)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if (self._inflight.get(key) is task):
+            del self._inflight[key]
+        if (not task.cancelled()):
+            # retrieved, so an error without any client left is not reported as never retrieved
+            task.exception()
+
+    async def _render(self, request: dict) -> bytes:
+        if (self._semaphore is None):
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        start = timer()
+        async with self._semaphore:
+            self._record('queue', start)
+            start = timer()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, render_png, request)
+            finally:
+                self._record('render', start)
+
+    def _record(self, name: str, start: float):
+        duration = timer() - start
+        self.metrics.record_span(Span(name, start, duration, ()))
+        if (name == 'request'):
+            self._latencies.append(duration)
+
+    def stats(self) -> dict:
+        """the latency metrics of the server
+
+        Returns:
+            dict: "spans" and "counters" of `MetricsCollector.summary`, "queue_depth",
+                and "latency": "p50", "p95", "p99" seconds of the recent requests, None if no request yet
+        """
+        stats = self.metrics.summary()
+        stats["queue_depth"] = self.queue_depth
+        latencies = sorted(self._latencies)
+        stats["latency"] = {
+            "p%d" % p: latencies[min(len(latencies) - 1, len(latencies) * p // 100)] if latencies else None
+            for p in (50, 95, 99)
+        }
+        return stats
+
+    async def handle_request(self, method: str, path: str, body: bytes = b'') -> tuple[int, str, bytes]:
+        """answer an HTTP request
+
+        * `POST /render` with a JSON request of `render` returns the PNG file, 400 if the request is invalid,
+          422 if it cannot be plotted and 503 if the queue is full
+        * `GET /metrics` returns the JSON of `stats`
+
+        Args:
+            method (str): the HTTP method
+            path (str): the request path
+            body (bytes, optional): the request body. Defaults to b''.
+
+        Returns:
+            (status, content_type, body): the response
+        """
+        if (path == '/metrics' and method == 'GET'):
+            return 200, 'application/json', json.dumps(self.stats()).encode()
+        if (path != '/render'):
+            return 404, 'text/plain', b'not found'
+        if (method != 'POST'):
+            return 405, 'text/plain', b'method not allowed'
+        try:
+            request = json.loads(body)
+            RenderJob.from_dict(request)
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, 'text/plain', ("invalid request: %s" % e).encode()
+        try:
+            return 200, 'image/png', await self.render(request)
+        except ServerBusy as e:
+            return 503, 'text/plain', str(e).encode()
+        except JobError as e:
+            return 422, 'text/plain', str(e).encode()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """serve the HTTP/1.1 requests of a connection, see `handle_request`"""
+        try:
+            while (True):
+                line = await reader.readline()
+                if (not line):
+                    break
+                method, path, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while (True):
+                    line = await reader.readline()
+                    if (line in (b'\r\n', b'\n', b'')):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                try:
+                    status, content_type, body = await self.handle_request(method, path, body)
+                except Exception as e:
+                    self.metrics.increment('errors')
+                    status, content_type, body = 500, 'text/plain', ("%s: %s" % (type(e).__name__, e)).encode()
+                writer.write(("HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n%s\r\n" % (
+                    status, HTTP_REASON.get(status, ''), content_type, len(body),
+                    "Retry-After: 1\r\n" if status == 503 else "")).encode('latin-1') + body)
+                await writer.drain()
+                if (headers.get('connection', '').lower() == 'close'):
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        """serve HTTP until cancelled
+
+        Args:
+            host (str, optional): the host to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): the port to listen on. Defaults to 8080.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """shut down the executor if created by the server"""
+        if (self._own_executor):
+            self.executor.shutdown()
+
+
+HTTP_REASON = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    422: 'Unprocessable Entity', 500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+
+class LocalClient():
+    """a client calling a `RenderServer` in the same process without any network, for tests and load tests"""
+
+    def __init__(self, server: RenderServer):
+        """
+        Args:
+            server (RenderServer): the server
+        """
+        self.server = server
+
+    async def request(self, method: str, path: str, body: bytes = b'') -> tuple[int, str, bytes]:
+        """send an HTTP request, see `RenderServer.handle_request`"""
+        return await self.server.handle_request(method, path, body)
+
+    async def render(self, request: dict) -> tuple[int, bytes]:
+        """post a render request
+
+        Args:
+            request (dict): the fields of `RenderJob.from_dict`
+
+        Returns:
+            (status, body): the HTTP status and the PNG file or the error message
+        """
+        status, content_type, body = await self.request('POST', '/render', json.dumps(request).encode())
+        return status, body
+
+    async def load_test(self, list_request: list[dict], concurrency: int = 8) -> dict:
+        """post requests with a fixed count of concurrent clients
+
+        Args:
+            list_request (list[dict]): the requests, posted in order
+            concurrency (int, optional): the count of concurrent clients. Defaults to 8.
+
+        Returns:
+            dict: "statuses": key: HTTP status, value: count, "wall": the seconds of all requests, "stats": the server's `stats`
+        """
+        queue = collections.deque(list_request)
+        statuses = collections.Counter()
+
+        async def client():
+            while (queue):
+                status, _ = await self.render(queue.popleft())
+                statuses[status] += 1
+
+        start = timer()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return {"statuses": dict(statuses), "wall": timer() - start, "stats": self.server.stats()}
+
+
+def main(argv: list[str] = None):
+    """serve emoji cloud rendering over HTTP from the command line"""
+    parser = argparse.ArgumentParser(prog='python -m EmojiCloud.server', description="serve emoji cloud rendering over HTTP")
+    parser.add_argument('--host', default='127.0.0.1', help="the host to listen on, default: 127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080, help="the port to listen on, default: 8080")
+    parser.add_argument('--workers', type=int, help="the number of worker processes, default: the number of CPUs")
+    parser.add_argument('--max-queue', type=int, help="the maximum count of requests waiting or rendering, default: 4 per worker")
+    parser.add_argument('--vendor', nargs='+', default=[], help="the vendors to index in each worker at start")
+    args = parser.parse_args(argv)
+
+    server = RenderServer(max_queue=args.max_queue, num_worker=args.workers, list_vendor=args.vendor)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+import numpy as np
+from PIL import Image
+
+from .metrics import span
+
+
+@dataclass(frozen=True, eq=False)
+class Sprite:
+    """an emoji image prepared for placement
+
+    All arrays are read-only and indexed by `[x, y]` like `CanvasBase.map_occupied`.
+    Positions are relative to the emoji center, the integer centroid of the opaque pixels.
+    """
+    # RGBA values of the image trimmed by `thold_alpha_bb`, cropped to the opaque pixels
+    rgba: np.ndarray
+    # whether each pixel of `rgba` is opaque (alpha != 0)
+    mask: np.ndarray
+    # the offset of the top-left corner of `mask` to the emoji center
+    offset_x: int
+    offset_y: int
+    # the offsets of the opaque pixels to the emoji center, sorted by their distance to the center in a descending order
+    pix_x: np.ndarray
+    pix_y: np.ndarray
+
+    @property
+    def w(self) -> int:
+        return self.mask.shape[0]
+
+    @property
+    def h(self) -> int:
+        return self.mask.shape[1]
+
+    @property
+    def area(self) -> int:
+        """the count of opaque pixels"""
+        return len(self.pix_x)
+
+    @property
+    def nbytes(self) -> int:
+        """the total size of the arrays"""
+        return self.rgba.nbytes + self.mask.nbytes + self.pix_x.nbytes + self.pix_y.nbytes
+
+    @property
+    def colors(self) -> np.ndarray:
+        """the RGBA values of the opaque pixels in the same order as `pix_x` and `pix_y`"""
+        return self.rgba[self.pix_x - self.offset_x, self.pix_y - self.offset_y]
+
+
+def trim_image_array(im_array: np.ndarray, thold_alpha: float) -> np.ndarray:
+    """remove the columns and then the rows whose alpha values are all below the threshold,
+    the same as `remove_pixel_outside_bb`
+
+    Args:
+        im_array (np.ndarray): an RGBA array of shape (height, width, 4)
+        thold_alpha (float): the threshold to distinguish white and non-white colors
+
+    Returns:
+        np.ndarray: the trimmed RGBA array of shape (height, width, 4)
+    """
+    im_array = im_array[:, (im_array[:, :, 3] >= thold_alpha).any(axis=0)]
+    return im_array[(im_array[:, :, 3] >= thold_alpha).any(axis=1)]
+
+
+def prepare_sprite(im: Image.Image, thold_alpha_bb: float) -> Sprite:
+    """prepare an emoji image for placement in one pass over the pixel array
+
+    Args:
+        im (Image.Image): the resized emoji image
+        thold_alpha_bb (float): the threshold to distinguish white and non-white colors for bounding box detection
+
+    Returns:
+        Sprite: the prepared emoji
+    """
+    with span('trim'):
+        im_array = trim_image_array(np.asarray(im.convert('RGBA')), thold_alpha_bb)
+    # opaque pixels in the order of rows
+    list_y, list_x = np.nonzero(im_array[:, :, 3] != 0)
+    if (len(list_x) == 0):
+        raise ValueError("the emoji image has no opaque pixel")
+    # the center point of the emoji image
+    img_center_x = int(int(list_x.sum()) / len(list_x))
+    img_center_y = int(int(list_y.sum()) / len(list_y))
+
+    # crop to the opaque pixels
+    mask_x, mask_y = int(list_x.min()), int(list_y.min())
+    rgba = np.ascontiguousarray(
+        im_array[mask_y:list_y.max() + 1, mask_x:list_x.max() + 1].transpose(1, 0, 2))
+    mask = rgba[:, :, 3] != 0
+
+    # sort opacity point by distant to the center point, farthest first
+    pix_x = (list_x - img_center_x).astype(np.int32)
+    pix_y = (list_y - img_center_y).astype(np.int32)
+    order = np.argsort(-(pix_x.astype(np.int64) ** 2 + pix_y.astype(np.int64) ** 2), kind='stable')
+    pix_x = pix_x[order]
+    pix_y = pix_y[order]
+
+    for array in (rgba, mask, pix_x, pix_y):
+        array.flags.writeable = False
+    return Sprite(
+        rgba=rgba,
+        mask=mask,
+        offset_x=mask_x - img_center_x,
+        offset_y=mask_y - img_center_y,
+        pix_x=pix_x,
+        pix_y=pix_y
+    )
@@ -1,11 +1,20 @@
 import math
 from PIL import Image
-from rich.console import Console
 from timeit import default_timer as timer
-import numpy as np
 
-global console
-console = Console()
+
+class LazyConsole():
+    """a proxy of the rich `Console`, created on first use so that importing the package does not import rich"""
+    _console = None
+
+    def __getattr__(self, name):
+        if (LazyConsole._console is None):
+            from rich.console import Console
+            LazyConsole._console = Console()
+        return getattr(LazyConsole._console, name)
+
+
+console = LazyConsole()
 
 
 def timeit(f):
@@ -87,44 +96,13 @@ def remove_pixel_outside_bb(im, thold_alpha):
     Returns:
         im_dense: the new image after removing bounding box
     """
-    # read image
-    im_data = im.getdata()
-    width, height = im.size
-    dict_pixel = {}  # key: coordinate, value: RGB value
-    # check pixels
-    for index, pixel in enumerate(im_data):
-        x = index % width
-        y = int(index / width)
-        dict_pixel[tuple([x, y])] = pixel
-    # remove transparent rows
-    list_row = []
-    for x in range(width):
-        flag = True
-        for y in range(height):
-            if (dict_pixel[tuple([x, y])][3] >= thold_alpha):
-                flag = False
-                break
-        if (not flag):
-            list_row.append([dict_pixel[tuple([x, y])] for y in range(height)])
-    # remove transparent columns
-    column_count = len(list_row[0])
-    list_column = []
-    for y in range(column_count):
-        flag = True
-        for row in list_row:
-            if (row[y][3] >= thold_alpha):
-                flag = False
-                break
-        if (not flag):
-            list_column.append([row[y] for row in list_row])
-    # reorganize new image
-    width = len(list_column[0])
-    height = len(list_column)
-    im_dense = Image.new('RGBA', (width, height))
-    for i in range(width):
-        for j in range(height):
-            im_dense.putpixel((i, j), list_column[j][i])
-    return im_dense
+    # imported on first use, the sprite module imports NumPy
+    import numpy as np
+    from .sprite import trim_image_array
+    im_array = trim_image_array(np.asarray(im.convert('RGBA')), thold_alpha)
+    if (im_array.size == 0):
+        raise ValueError("no pixel has an alpha value of at least %s" % thold_alpha)
+    return Image.fromarray(np.ascontiguousarray(im_array), 'RGBA')
 
 
 # def remove_pixel_outside_bb(im, thold_alpha):
@@ -30,4 +30,11 @@ JOYPIXEL_PATH = os.path.join(data_dir, JOYPIXEL)
 SAMSUNG = 'Sams'
 SAMSUNG_PATH = os.path.join(data_dir, SAMSUNG)
 
-vendor_dir_list = os.listdir(data_dir)
\ No newline at end of file
+
+def __getattr__(name):
+    # list the data directory on first access of `vendor_dir_list` instead of at import
+    if (name == 'vendor_dir_list'):
+        global vendor_dir_list
+        vendor_dir_list = os.listdir(data_dir)
+        return vendor_dir_list
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
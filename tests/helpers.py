@@ -0,0 +1,15 @@
+from PIL import Image, ImageDraw
+from EmojiCloud.emoji import EmojiItem
+
+
+def create_emoji_list(weights, vendor='Test', size=72, color=None):
+    """create emojis of synthetic images, an ellipse of its own color for each emoji, or squares of `color`"""
+    emoji_list = []
+    for i, weight in enumerate(weights):
+        if (color is None):
+            im = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+            ImageDraw.Draw(im).ellipse([i, 2, size - 2 - i, size - 3], fill=(30 * i, 100, 0, 255))
+        else:
+            im = Image.new('RGBA', (size, size), color)
+        emoji_list.append(EmojiItem.from_image('1f60%d' % i, weight, vendor, im))
+    return emoji_list
@@ -0,0 +1,123 @@
+import os
+import json
+import numpy as np
+from PIL import Image, ImageDraw
+from EmojiCloud.atlas import build_atlas, load_atlas, get_atlas_path
+from EmojiCloud.availability import VendorIndex
+
+
+def create_vendor_dir(vendor_dir):
+    os.makedirs(vendor_dir)
+    for i, size in enumerate([(72, 72), (40, 30), (16, 20)]):
+        im = Image.new('RGBA', size, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(im)
+        draw.ellipse([i + 2, 3, size[0] - 4, size[1] - 2 * i - 3], fill=(50 * i, 255, 0, 200 + i))
+        im.save(os.path.join(vendor_dir, 'U+1F60%d.png' % i))
+    # an image without opaque pixels and an image not in RGBA
+    Image.new('RGBA', (8, 8), (0, 0, 0, 0)).save(os.path.join(vendor_dir, 'U+1F610.png'))
+    Image.new('P', (10, 12), 3).save(os.path.join(vendor_dir, 'U+1F611.png'))
+
+
+def test_build_atlas(tmp_path):
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    atlas = build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+
+    assert len(atlas) == 5
+    assert 'U+1F600' in atlas and 'U+1F612' not in atlas
+    for unicode in atlas.unicodes:
+        im_array = np.asarray(Image.open(os.path.join(vendor_dir, unicode + '.png')).convert('RGBA'))
+        assert np.array_equal(atlas.get_array(unicode), im_array)
+        assert np.array_equal(np.asarray(atlas.get_image(unicode)), im_array)
+        entry = atlas.get_entry(unicode)
+        list_y, list_x = np.nonzero(im_array[:, :, 3])
+        assert entry.count_opaque == len(list_x)
+        if (len(list_x) > 0):
+            assert entry.bbox == (list_x.min(), list_y.min(), list_x.max() + 1, list_y.max() + 1)
+    assert atlas.get_entry('U+1F610').count_opaque == 0
+    # zero-copy views of the mapped file
+    assert isinstance(atlas.data, np.memmap)
+    assert not atlas.get_array('U+1F600').flags.writeable
+
+
+def test_load_atlas(tmp_path):
+    assert load_atlas('Test', atlas_dir=str(tmp_path)) is None
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+    atlas = load_atlas('Test', atlas_dir=str(tmp_path))
+    assert len(atlas) == 5
+    assert load_atlas('Test', atlas_dir=str(tmp_path)) is atlas
+    assert sorted(os.listdir(tmp_path)) == sorted(['Test', os.path.basename(get_atlas_path('Test')), os.path.basename(atlas.path_data)])
+    assert os.path.basename(atlas.path_data).startswith('Test.atlas.')
+
+
+def test_rebuild_atlas(tmp_path):
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+    os.remove(os.path.join(vendor_dir, 'U+1F600.png'))
+    atlas = build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+    assert len(atlas) == 4
+    assert load_atlas('Test', atlas_dir=str(tmp_path)) is not None
+    # the data of the previous build is removed
+    assert sorted(os.listdir(tmp_path)) == sorted(['Test', os.path.basename(get_atlas_path('Test')), os.path.basename(atlas.path_data)])
+
+
+def test_atlas_mismatch(tmp_path):
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+    # an index not matching its data file is not loaded, so the PNG files are read instead
+    path_index = get_atlas_path('Test', str(tmp_path))
+    with open(path_index) as f:
+        index = json.load(f)
+    index['size'] += 1
+    with open(path_index, 'w') as f:
+        json.dump(index, f)
+    assert load_atlas('Test', atlas_dir=str(tmp_path)) is None
+
+
+def test_build_atlas_failure(tmp_path):
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    with open(os.path.join(vendor_dir, 'U+1F612.png'), 'wb') as f:
+        f.write(b'not a png')
+    try:
+        build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+        assert False
+    except OSError:
+        pass
+    assert os.listdir(tmp_path) == ['Test']
+
+
+def test_emoji_item_from_atlas(tmp_path, monkeypatch):
+    import EmojiCloud.atlas
+    import EmojiCloud.emoji
+    from EmojiCloud.emoji import EmojiItem, EmojiManager
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    atlas = build_atlas('Test', vendor_dir=vendor_dir, atlas_dir=str(tmp_path))
+    monkeypatch.setattr(EmojiCloud.atlas, 'load_atlas', lambda vendor, atlas_dir=None: atlas if vendor == 'Test' else None)
+    # an index of the atlas only
+    os.rename(vendor_dir, str(tmp_path / 'Moved'))
+    monkeypatch.setattr(EmojiCloud.emoji, 'vendor_index', VendorIndex(str(tmp_path), atlas_dir=str(tmp_path)))
+
+    assert EmojiManager.check_exists('U+1F601', 'Test')
+    assert not EmojiManager.check_exists('U+1F612', 'Test')
+    e = EmojiItem('U+1F601', 1, 'Test')
+    assert e.exists()
+    assert np.array_equal(np.asarray(e.image), atlas.get_array('U+1F601'))
+    assert e.sprite_key == ('Test', 'U+1F601')
+
+
+def test_load_atlas_default_dir(tmp_path, monkeypatch):
+    import EmojiCloud.atlas
+    monkeypatch.setattr(EmojiCloud.atlas, 'data_dir', str(tmp_path))
+    vendor_dir = str(tmp_path / 'Test')
+    create_vendor_dir(vendor_dir)
+    assert load_atlas('Test') is None
+    build_atlas('Test', vendor_dir=vendor_dir)
+    # the default directory shares the atlas loaded from the data directory and is cleared by a rebuild
+    atlas = load_atlas('Test')
+    assert atlas is not None and load_atlas('Test', atlas_dir=str(tmp_path)) is atlas
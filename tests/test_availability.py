@@ -0,0 +1,49 @@
+import os
+import json
+from PIL import Image
+from EmojiCloud.availability import VendorIndex, write_manifest
+
+
+def create_data_dir(data_dir):
+    for vendor, list_unicode in [('Twtr', ['U+1F600', 'U+1F601']), ('Goog', ['U+1F601', 'U+1F602-U+1F3FB'])]:
+        os.makedirs(os.path.join(data_dir, vendor))
+        for unicode in list_unicode:
+            Image.new('RGBA', (4, 4)).save(os.path.join(data_dir, vendor, unicode + '.png'))
+    open(os.path.join(data_dir, 'Twtr', 'readme.txt'), 'w').close()
+
+
+def test_vendor_index(tmp_path):
+    data_dir = str(tmp_path)
+    create_data_dir(data_dir)
+    index = VendorIndex(data_dir, atlas_dir=data_dir)
+
+    assert index.get_unicodes('Twtr') == {'U+1F600', 'U+1F601'}
+    assert index.exists('U+1F602-U+1F3FB', 'Goog')
+    assert not index.exists('U+1F600', 'Goog')
+    assert not index.exists('U+1F600', 'Sams')
+    assert index.filter_exist(['U+1F602', 'U+1F601', 'U+1F600'], 'Twtr') == ['U+1F601', 'U+1F600']
+
+    # indexed once until invalidated
+    Image.new('RGBA', (4, 4)).save(os.path.join(data_dir, 'Twtr', 'U+1F602.png'))
+    assert not index.exists('U+1F602', 'Twtr')
+    index.invalidate('Twtr')
+    assert index.exists('U+1F602', 'Twtr')
+
+
+def test_manifest(tmp_path):
+    data_dir = str(tmp_path)
+    create_data_dir(data_dir)
+    manifest = write_manifest(data_dir)
+    assert manifest == {'Goog': ['U+1F601', 'U+1F602-U+1F3FB'], 'Twtr': ['U+1F600', 'U+1F601']}
+    with open(os.path.join(data_dir, 'manifest.json')) as f:
+        assert json.load(f) == manifest
+
+    # the manifest is read instead of the vendor directories
+    os.remove(os.path.join(data_dir, 'Twtr', 'U+1F600.png'))
+    index = VendorIndex(data_dir, atlas_dir=data_dir)
+    assert index.exists('U+1F600', 'Twtr')
+    assert index.get_unicodes('Sams') == frozenset()
+    # a vendor missing from the manifest is scanned
+    os.makedirs(os.path.join(data_dir, 'Custom'))
+    Image.new('RGBA', (4, 4)).save(os.path.join(data_dir, 'Custom', 'U+1F600.png'))
+    assert index.get_unicodes('Custom') == {'U+1F600'}
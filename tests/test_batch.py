@@ -0,0 +1,75 @@
+import json
+from PIL import Image
+import EmojiCloud.emoji
+from EmojiCloud.availability import VendorIndex
+from EmojiCloud.benchmark import make_synthetic_sprite
+from EmojiCloud.batch import CanvasSpec, RenderJob, render_batch, get_canvas, main
+
+
+def make_vendor_dir(tmp_path, monkeypatch, count=5):
+    (tmp_path / 'data' / 'Synthetic').mkdir(parents=True)
+    for i in range(count):
+        make_synthetic_sprite(i).save(tmp_path / 'data' / 'Synthetic' / ('U+%04X.png' % i))
+    monkeypatch.setattr(EmojiCloud.emoji, 'data_dir', str(tmp_path / 'data'))
+    monkeypatch.setattr(EmojiCloud.emoji, 'vendor_index', VendorIndex(str(tmp_path / 'data')))
+
+
+def test_render_batch(tmp_path, monkeypatch):
+    make_vendor_dir(tmp_path, monkeypatch)
+    weights = {'%04x' % i: i + 1 for i in range(5)}
+    list_job = [
+        RenderJob(weights, 'Synthetic', CanvasSpec('rectangle', 80, 60), str(tmp_path / 'a.png'), id='a'),
+        RenderJob(weights, 'Synthetic', CanvasSpec('ellipse', 80, 80), str(tmp_path / 'b.png'), options={'placement': 'coarse'}),
+        RenderJob({'ffff': 1}, 'Synthetic', CanvasSpec('rectangle', 80, 60), str(tmp_path / 'c.png'), id='c'),
+    ]
+    for num_worker in [0, 2]:
+        dict_result = {r.id: r for r in render_batch(list_job, num_worker, ['Synthetic'], max_pending=1)}
+        assert dict_result['a'].success and dict_result['a'].count == 5
+        assert dict_result[str(tmp_path / 'b.png')].success
+        assert not dict_result['c'].success and dict_result['c'].error == "no existing emoji"
+        assert Image.open(tmp_path / 'a.png').size == (80, 60)
+    # a job without output is plotted but not saved
+    result, = render_batch([RenderJob(weights, 'Synthetic', CanvasSpec('rectangle', 80, 60), id='d')], 0)
+    assert result.success and result.count == 5 and result.output is None
+    # the canvas is created once per process
+    spec = CanvasSpec('rectangle', 80, 60)
+    assert get_canvas(spec) is get_canvas(CanvasSpec.from_dict({'shape': 'rectangle', 'width': 80, 'height': 60}))
+
+
+def test_get_canvas_lru(tmp_path):
+    canvas = get_canvas(CanvasSpec('rectangle', 10, 10), max_canvases=2)
+    assert get_canvas(CanvasSpec('rectangle', 10, 10), max_canvases=2) is canvas
+    get_canvas(CanvasSpec('rectangle', 11, 10), max_canvases=2)
+    get_canvas(CanvasSpec('rectangle', 12, 10), max_canvases=2)
+    assert get_canvas(CanvasSpec('rectangle', 10, 10), max_canvases=2) is not canvas
+
+    # a masked canvas is created again once its mask file changes
+    path_mask = str(tmp_path / 'mask.png')
+    Image.new('RGBA', (20, 20), (0, 0, 0, 255)).save(path_mask)
+    spec = CanvasSpec('masked', mask=path_mask)
+    canvas = get_canvas(spec)
+    assert get_canvas(spec) is canvas
+    Image.new('RGBA', (30, 20), (0, 0, 0, 255)).save(path_mask)
+    assert get_canvas(spec).w == canvas.w + 10
+
+
+def test_main(tmp_path, monkeypatch):
+    make_vendor_dir(tmp_path, monkeypatch)
+    path_jobs = tmp_path / 'jobs.jsonl'
+    with open(path_jobs, 'w') as f:
+        for i in range(3):
+            f.write(json.dumps({
+                "id": str(i), "weights": {"0000": 1, "0001": 2}, "vendor": "Synthetic",
+                "canvas": {"shape": "ellipse", "width": 60, "height": 60}, "output": str(tmp_path / ('%d.png' % i))
+            }) + "\n")
+        f.write("\n")
+        f.write("{not json\n")
+        f.write(json.dumps({"weights": {"0000": 1}}) + "\n")
+    path_results = tmp_path / 'results.jsonl'
+    # the malformed lines fail alone
+    assert main([str(path_jobs), '--output', str(path_results), '--workers', '0']) == 1
+    with open(path_results) as f:
+        list_result = [json.loads(line) for line in f]
+    assert sorted(r["id"] for r in list_result) == ["0", "1", "2", "line 5", "line 6"]
+    assert all(r["success"] and r["count"] == 2 for r in list_result[:3])
+    assert list_result[3]["error"].startswith("JSONDecodeError") and list_result[4]["error"] == "KeyError: 'vendor'"
@@ -0,0 +1,63 @@
+import json
+import numpy as np
+import EmojiCloud.benchmark
+from EmojiCloud.benchmark import make_synthetic_sprite, make_synthetic_emoji_list, run_benchmark, compare_results, get_case_key, main, QUICK_MATRIX, BASELINE_PATH
+
+
+def test_synthetic_sprite():
+    for seed in range(3):
+        im = make_synthetic_sprite(seed)
+        assert im.size == (72, 72)
+        assert (np.asarray(im)[:, :, 3] == 255).any()
+        assert im.tobytes() == make_synthetic_sprite(seed).tobytes()
+    emoji_list = make_synthetic_emoji_list(4)
+    assert len(set(e.unicode for e in emoji_list)) == 4
+    assert all(e.sprite_key is not None for e in emoji_list)
+
+
+def test_run_benchmark():
+    matrix = {"canvas": ["rectangle", "masked"], "size": [60], "count": [3]}
+    results = run_benchmark(matrix, track_memory=True)
+    assert [r["canvas"] for r in results["results"]] == ["rectangle", "masked"]
+    for result in results["results"]:
+        assert result["success"]
+        assert result["wall"] > 0
+        assert result["peak_memory"] > 0
+        assert "search" in result["spans"]
+    assert compare_results(results, results) == []
+
+    # slower than the baseline
+    baseline = {"results": [dict(r, wall=r["wall"] / 2) for r in results["results"]]}
+    list_regression = compare_results(results, baseline)
+    assert [r["metric"] for r in list_regression] == ["wall", "wall"]
+    assert list_regression[0]["ratio"] > 1.9
+
+
+def test_stored_baseline():
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    # every case of the quick matrix with the default placement and search
+    assert sorted(get_case_key(r) for r in baseline["results"]) == sorted(
+        (canvas, size, count, 'scan', 'linear')
+        for canvas in QUICK_MATRIX["canvas"] for size in QUICK_MATRIX["size"] for count in QUICK_MATRIX["count"])
+    assert all(r["success"] and r["wall"] > 0 and r["peak_memory"] > 0 for r in baseline["results"])
+
+
+def test_main_baseline(tmp_path, monkeypatch):
+    argv = ['--canvas', 'rectangle', '--size', '60', '--count', '3', '--repeat', '1', '--no-memory']
+    path_results = str(tmp_path / 'results.json')
+    assert main(argv + ['--no-baseline', '--output', path_results]) == 0
+    with open(path_results) as f:
+        results = json.load(f)
+
+    # a far faster baseline of another machine
+    path_baseline = str(tmp_path / 'baseline.json')
+    with open(path_baseline, 'w') as f:
+        json.dump({
+            "environment": dict(results["environment"], cpu_count=results["environment"]["cpu_count"] + 1),
+            "results": [dict(r, wall=r["wall"] / 100) for r in results["results"]]
+        }, f)
+    # regressions fail given the baseline, but not from the stored baseline of another machine
+    assert main(argv + ['--baseline', path_baseline]) == 1
+    monkeypatch.setattr(EmojiCloud.benchmark, 'BASELINE_PATH', path_baseline)
+    assert main(argv) == 0
@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from PIL import Image
+import EmojiCloud.cache
+from EmojiCloud.cache import SpriteCache, ResultCache
+from EmojiCloud.sprite import prepare_sprite
+from EmojiCloud.emoji import EmojiItem
+from EmojiCloud.canvas import RectangleCanvas
+from EmojiCloud.plot import plot_dense_emoji_cloud, layout_dense_emoji_cloud
+from tests.helpers import create_emoji_list
+
+
+def create_sprite(size):
+    return prepare_sprite(Image.new('RGBA', (size, size), (255, 0, 0, 255)), 4)
+
+
+def test_lru_eviction():
+    sprite = create_sprite(10)
+    cache = SpriteCache(max_bytes=sprite.nbytes * 2)
+    cache.put('a', sprite)
+    cache.put('b', create_sprite(10))
+    assert cache.get('a') is sprite
+    # 'b' is the least recently used
+    cache.put('c', create_sprite(10))
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.stats() == {'hits': 1, 'misses': 0, 'evictions': 1, 'items': 2, 'nbytes': sprite.nbytes * 2}
+
+    cache.configure(max_items=1)
+    assert len(cache) == 1 and 'c' in cache
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_get_or_create():
+    cache = SpriteCache()
+    list_created = []
+
+    def create():
+        list_created.append(1)
+        return create_sprite(5)
+
+    sprite = cache.get_or_create(('Twtr', 'U+1F600', (5, 5), 4), create)
+    assert cache.get_or_create(('Twtr', 'U+1F600', (5, 5), 4), create) is sprite
+    # not cached without a key
+    cache.get_or_create(None, create)
+    assert len(list_created) == 2
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    threads = [threading.Thread(target=cache.get_or_create, args=(i % 4, create)) for i in range(32)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(cache) == 5
+
+
+def test_sprite_key():
+    im = Image.new('RGBA', (4, 4))
+    # a customized image is never cached by the vendor's key
+    assert EmojiItem.from_image('1f600', 1, 'Twtr', im).sprite_key is None
+    emoji_item = EmojiItem.from_image('1f600', 1, 'Twtr', im, vendor_image=True)
+    assert emoji_item.image is im and emoji_item.sprite_key == ('Twtr', 'U+1F600')
+
+
+def test_result_cache(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    canvas = RectangleCanvas(80, 60)
+    im = plot_dense_emoji_cloud(canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), cache=cache)
+    assert cache.misses == 1 and cache.hits == 0
+    im_cached = plot_dense_emoji_cloud(RectangleCanvas(80, 60), create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), search='parallel', cache=cache)
+    assert cache.hits == 1
+    assert im_cached.tobytes() == im.tobytes()
+    # scaled weights and another order of the emojis hit
+    emoji_list = create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255))[::-1]
+    for e in emoji_list:
+        e.weight *= 3
+    assert plot_dense_emoji_cloud(canvas, emoji_list, cache=cache).tobytes() == im.tobytes()
+    assert cache.hits == 2
+
+    # other images, arguments or canvases miss
+    plot_dense_emoji_cloud(canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(0, 0, 255, 255)), cache=cache)
+    plot_dense_emoji_cloud(canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), blend=True, cache=cache)
+    plot_dense_emoji_cloud(RectangleCanvas(80, 61), create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), cache=cache)
+    assert cache.misses == 4
+
+    layout = layout_dense_emoji_cloud(canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), cache=cache)
+    assert layout_dense_emoji_cloud(canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)), cache=cache) == layout
+    assert cache.hits == 3
+    # results of another version miss
+    key = ResultCache.make_key('image', canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255)))
+    monkeypatch.setattr(EmojiCloud.cache, 'RESULT_VERSION', EmojiCloud.cache.RESULT_VERSION + 1)
+    assert ResultCache.make_key('image', canvas, create_emoji_list([3, 2, 1], 'Twtr', color=(255, 0, 0, 255))) != key
+    # no temporary file is left
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith('.tmp')]
+
+
+def test_result_cache_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        cache.put_bytes('%064x' % i, '.json', b'x' * 100)
+        # distinct times of last use
+        os.utime(cache.get_path('%064x' % i, '.json'), (time.time() - 10 + i, time.time() - 10 + i))
+    # the least recently used file is removed
+    assert cache.get_bytes('%064x' % 0, '.json') is None
+    assert cache.get_bytes('%064x' % 2, '.json') == b'x' * 100
+    cache.clear()
+    assert cache.get_bytes('%064x' % 2, '.json') is None
@@ -0,0 +1,102 @@
+import math
+import numpy as np
+from EmojiCloud.canvas import EllipseCanvas, RectangleCanvas, MaskedCanvas, ShapeCanvas, calculate_contour_mask, dilate_mask
+from EmojiCloud.canvas import check_point_within_ellipse, make_polygon_shape, make_rounded_rectangle_shape, make_heart_shape
+from EmojiCloud.util import distance_between_two_points, sort_dictionary_by_value
+
+
+def test_sorted_canvas_pix():
+    canvas = EllipseCanvas(31, 20)
+    dict_dist_canvas_center = {}
+    for x in range(canvas.w):
+        for y in range(canvas.h):
+            if (not canvas.map_occupied[x, y]):
+                dict_dist_canvas_center[(x, y)] = distance_between_two_points(x, y, canvas.center_x, canvas.center_y)
+    list_canvas_pix = [x_y for (x_y, dist) in sort_dictionary_by_value(dict_dist_canvas_center, reverse=False)]
+    assert [tuple(x_y) for x_y in canvas.calculate_sorted_canvas_pix_for_plotting().tolist()] == list_canvas_pix
+
+
+def test_sorted_canvas_pix_cache():
+    canvas = RectangleCanvas(10, 8)
+    list_canvas_pix = canvas.calculate_sorted_canvas_pix_for_plotting()
+    assert len(list_canvas_pix) == 80
+    assert canvas.calculate_sorted_canvas_pix_for_plotting() is list_canvas_pix
+    # recalculated after the occupancy changes
+    canvas.map_occupied[canvas.center_x, canvas.center_y] = True
+    list_canvas_pix = canvas.calculate_sorted_canvas_pix_for_plotting()
+    assert len(list_canvas_pix) == 79
+    assert tuple(list_canvas_pix[0]) != (canvas.center_x, canvas.center_y)
+
+
+def test_contour_mask():
+    rng = np.random.default_rng(0)
+    alpha = rng.integers(0, 256, (9, 7))
+    contour = calculate_contour_mask(alpha, 60)
+    # scan the alpha channel pixel by pixel
+    list_contour = set()
+    for x in range(9):
+        prev_alpha = alpha[x, 0]
+        for y in range(1, 7):
+            if (abs(alpha[x, y] - prev_alpha) > 60):
+                list_contour.add((x, y))
+                prev_alpha = alpha[x, y]
+    for y in range(1, 7):
+        prev_alpha = alpha[0, y]
+        for x in range(9):
+            if (abs(alpha[x, y] - prev_alpha) > 60):
+                list_contour.add((x, y))
+                prev_alpha = alpha[x, y]
+    assert set(zip(*np.nonzero(contour))) == list_contour
+
+
+def test_dilate_mask():
+    mask = np.zeros((6, 5), dtype=bool)
+    mask[1, 1] = mask[4, 4] = True
+    dilated = dilate_mask(mask, 2)
+    assert dilated.sum() == 4 + 2
+    assert dilated[1:3, 1:3].all()
+    assert dilated[4:6, 4].all()
+    assert (dilate_mask(mask, 1) == mask).all()
+    assert not dilate_mask(mask, 0).any()
+
+
+def test_ellipse_canvas():
+    canvas = EllipseCanvas(41, 26)
+    for x in range(canvas.w):
+        for y in range(canvas.h):
+            flag = check_point_within_ellipse(canvas.center_x, canvas.center_y, x, y, canvas.w/2, canvas.h/2)
+            assert canvas.map_occupied[x, y] == (not flag)
+    assert canvas.area == (41/2) * (26/2) * math.pi
+
+
+def test_shape_canvas():
+    # a right triangle
+    canvas = ShapeCanvas(50, 40, make_polygon_shape([(0, 0), (49, 0), (0, 39)]))
+    assert canvas.map_occupied.shape == (50, 40)
+    assert not canvas.map_occupied[1, 1]
+    assert canvas.map_occupied[48, 38]
+    assert abs(canvas.area - 50 * 40 / 2) < 50
+    assert canvas.area == (~canvas.map_occupied).sum()
+
+    canvas = ShapeCanvas(50, 40, make_rounded_rectangle_shape(50, 40, 10))
+    assert canvas.map_occupied[0, 0] and canvas.map_occupied[49, 39]
+    assert not canvas.map_occupied[10, 0] and not canvas.map_occupied[0, 20]
+
+    canvas = ShapeCanvas(60, 60, make_heart_shape(60, 60))
+    assert not canvas.map_occupied[30, 35]
+    assert canvas.map_occupied[30, 5] and canvas.map_occupied[0, 59]
+
+    canvas = ShapeCanvas(20, 10, lambda x, y: x < 5)
+    assert canvas.area == 50
+
+
+def test_fingerprint():
+    assert RectangleCanvas(30, 20).fingerprint() == RectangleCanvas(30, 20).fingerprint()
+    assert RectangleCanvas(30, 20).fingerprint() != RectangleCanvas(30, 21).fingerprint()
+    assert RectangleCanvas(30, 20).fingerprint() != RectangleCanvas(30, 20, color='black').fingerprint()
+    assert EllipseCanvas(30, 20).fingerprint() != RectangleCanvas(30, 20).fingerprint()
+    # a modified canvas has a new fingerprint
+    canvas = RectangleCanvas(30, 20)
+    digest = canvas.fingerprint()
+    canvas.map_occupied[3, 4] = True
+    assert canvas.fingerprint() != digest
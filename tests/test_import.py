@@ -0,0 +1,35 @@
+import os
+import sys
+import subprocess
+import pytest
+from EmojiCloud.config import data_dir
+
+# the budget of importing the light modules, in microseconds, generous for slow machines
+IMPORT_BUDGET_US = 300000
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+
+
+def test_import_is_lazy():
+    code = "import sys, EmojiCloud.emoji, EmojiCloud.vendors, EmojiCloud.util; " \
+        "print(','.join(m for m in ('numpy', 'rich', 'EmojiCloud.atlas') if m in sys.modules))"
+    assert run_python(code).stdout.strip() == ''
+
+
+def test_import_time():
+    result = run_python("import EmojiCloud.emoji, EmojiCloud.vendors, EmojiCloud.util")
+    # lines of "import time: self [us] | cumulative | imported package"
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if (len(fields) == 3 and fields[2].strip() in ('EmojiCloud.emoji', 'EmojiCloud.vendors', 'EmojiCloud.util')):
+            cumulative += int(fields[1])
+    assert 0 < cumulative < IMPORT_BUDGET_US
+
+
+@pytest.mark.skipif(not os.path.isdir(data_dir), reason="the vendor data is not downloaded")
+def test_vendor_dir_list():
+    import EmojiCloud.vendors
+    assert EmojiCloud.vendors.vendor_dir_list == os.listdir(data_dir)
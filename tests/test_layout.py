@@ -0,0 +1,76 @@
+from PIL import Image
+from EmojiCloud.plot import plot_dense_emoji_cloud, layout_dense_emoji_cloud, render_layout, update_layout
+from EmojiCloud.occupancy import OccupancyGrid
+from EmojiCloud.sprite import prepare_sprite
+from EmojiCloud.layout import Layout
+from EmojiCloud.emoji import EmojiItem
+from EmojiCloud.canvas import EllipseCanvas
+from tests.helpers import create_emoji_list
+
+
+WEIGHTS = [1 + i % 3 for i in range(8)]
+
+
+def test_layout():
+    canvas = EllipseCanvas(100, 80)
+    emoji_list = create_emoji_list(WEIGHTS)
+    layout = layout_dense_emoji_cloud(canvas, emoji_list)
+    assert (layout.width, layout.height) == (100, 80)
+    assert len(layout.placements) == len(emoji_list)
+    assert layout.placements[0].unicode == 'U+1F602'
+    assert Layout.from_json(layout.to_json()) == layout
+
+    images = {(e.vendor, e.unicode): e.image for e in emoji_list}
+    im = plot_dense_emoji_cloud(canvas, emoji_list)
+    im_render = render_layout(layout, background=canvas.img, images=images)
+    assert im_render.tobytes() == im.tobytes()
+
+    im_large = render_layout(layout, 3, background=canvas.img, images=images)
+    assert im_large.size == (300, 240)
+    # the emoji at the center is drawn at the scaled center
+    p = layout.placements[0]
+    assert im_large.getpixel((p.x * 3, p.y * 3)) == im.getpixel((p.x, p.y))
+
+
+def check_no_overlap(canvas, layout, images):
+    grid = OccupancyGrid(canvas.map_occupied)
+    for p in layout.placements:
+        sprite = prepare_sprite(images[(p.vendor, p.unicode)].resize((p.width, p.height), Image.LANCZOS), layout.thold_alpha_bb)
+        assert grid.check_fit(sprite.mask, p.x + sprite.offset_x, p.y + sprite.offset_y)
+        grid.stamp(sprite.mask, p.x + sprite.offset_x, p.y + sprite.offset_y)
+
+
+def test_update_layout():
+    canvas = EllipseCanvas(160, 120)
+    emoji_list = create_emoji_list(WEIGHTS)
+    layout = layout_dense_emoji_cloud(canvas, emoji_list)
+
+    # the same relative weights keep all emojis
+    for e in emoji_list:
+        e.weight *= 2
+    assert update_layout(layout, canvas, emoji_list) == layout
+
+    # a small change of the lightest emoji and a new emoji
+    emoji_list[0].weight *= 1.02
+    im = Image.new('RGBA', (72, 72), (0, 0, 255, 255))
+    emoji_list.append(EmojiItem.from_image('1f610', 1, 'Test', im))
+    layout_update = update_layout(layout, canvas, emoji_list, relayout=False)
+    assert len(layout_update.placements) == len(emoji_list)
+    assert layout_update.relax_ratio == layout.relax_ratio
+    previous = {p.unicode: p for p in layout.placements}
+    kept = [p for p in layout_update.placements if previous.get(p.unicode) == p]
+    assert len(kept) >= len(layout.placements) - 2
+    check_no_overlap(canvas, layout_update, {(e.vendor, e.unicode): e.image for e in emoji_list})
+
+
+def test_update_layout_zero_weight():
+    canvas = EllipseCanvas(160, 120)
+    emoji_list = create_emoji_list(WEIGHTS)
+    emoji_list[0].weight = 0
+    layout = layout_dense_emoji_cloud(canvas, emoji_list)
+    assert update_layout(layout, canvas, emoji_list) == layout
+    # an emoji gaining weight from zero is placed again
+    emoji_list[0].weight = 1
+    layout_update = update_layout(layout, canvas, emoji_list, relayout=False)
+    assert all(p.scale > 0 for p in layout_update.placements)
+    check_no_overlap(canvas, layout_update, {(e.vendor, e.unicode): e.image for e in emoji_list})
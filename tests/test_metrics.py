@@ -0,0 +1,68 @@
+import tracemalloc
+from PIL import Image, ImageDraw
+from EmojiCloud.metrics import MetricsCollector, collect_metrics, span, increment, timed
+from EmojiCloud.plot import plot_dense_emoji_cloud
+from EmojiCloud.emoji import EmojiItem
+from EmojiCloud.canvas import RectangleCanvas
+
+
+def test_disabled():
+    # no collector, nothing is recorded
+    with span('phase'):
+        increment('count')
+    collector = MetricsCollector()
+    with collect_metrics(collector):
+        pass
+    assert collector.summary() == {'spans': {}, 'counters': {}}
+
+
+def test_spans_and_counters():
+    list_span = []
+
+    @timed('outer')
+    def outer():
+        for i in range(3):
+            with span('inner'):
+                increment('count', 2)
+
+    with collect_metrics(sink=list_span.append) as collector:
+        outer()
+    summary = collector.summary()
+    assert summary['counters'] == {'count': 6}
+    assert summary['spans']['inner']['count'] == 3
+    assert summary['spans']['outer']['count'] == 1
+    assert summary['spans']['outer']['total'] >= summary['spans']['inner']['total']
+    assert [s.name for s in list_span] == ['inner'] * 3 + ['outer']
+    assert list_span[0].parents == ('outer',)
+    assert list_span[0].peak_memory is None
+
+
+def test_peak_memory():
+    with collect_metrics(track_memory=True) as collector:
+        with span('outer'):
+            with span('inner'):
+                data = bytearray(1024 * 1024)
+                del data
+            with span('small'):
+                pass
+    summary = collector.summary()['spans']
+    assert summary['inner']['peak_memory'] >= 1024 * 1024
+    assert summary['small']['peak_memory'] < 1024 * 1024
+    assert summary['outer']['peak_memory'] >= summary['inner']['peak_memory']
+    assert not tracemalloc.is_tracing()
+
+
+def test_plot_metrics():
+    emoji_list = []
+    for i in range(5):
+        im = Image.new('RGBA', (20, 20), (0, 0, 0, 0))
+        ImageDraw.Draw(im).ellipse([2, 2, 17, 17], fill=(40 * i, 0, 0, 255))
+        emoji_list.append(EmojiItem.from_image('1f60%d' % i, i + 1, 'Test', im))
+    with collect_metrics() as collector:
+        plot_dense_emoji_cloud(RectangleCanvas(60, 60), emoji_list)
+    summary = collector.summary()
+    for name in ('plot', 'canvas_order', 'load', 'attempt', 'resize', 'trim', 'search', 'stamp'):
+        assert name in summary['spans']
+    assert summary['spans']['search']['count'] == summary['counters']['emojis_plotted'] + summary['counters']['attempts'] - 1
+    assert summary['counters']['candidates'] > 0
+    assert summary['counters']['pixel_tests'] > 0
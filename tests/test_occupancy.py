@@ -0,0 +1,169 @@
+import numpy as np
+import EmojiCloud.occupancy
+from EmojiCloud.occupancy import OccupancyGrid, CoarseOccupancyGrid, CandidateIndex, calculate_summed_area_table, find_solid_blocks, max_pool, coarsen_mask
+
+
+def test_check_fit():
+    map_occupied = np.zeros((10, 8), dtype=bool)
+    map_occupied[5, 5] = True
+    grid = OccupancyGrid(map_occupied)
+    mask = np.ones((3, 3), dtype=bool)
+    mask[1, 1] = False
+
+    assert grid.check_fit(mask, 0, 0)
+    # overlaps the occupied pixel
+    assert not grid.check_fit(mask, 3, 3)
+    # the occupied pixel falls into the transparent hole of the mask
+    assert grid.check_fit(mask, 4, 4)
+    # out of the canvas
+    assert not grid.check_fit(mask, 8, 0)
+    assert not grid.check_fit(mask, -1, 0)
+
+    xs = np.array([0, 3, 4, 8, -1, 7])
+    ys = np.array([0, 3, 4, 0, 0, 5])
+    fit = grid.check_fit_batch(mask, xs, ys)
+    assert fit.tolist() == [grid.check_fit(mask, x, y) for x, y in zip(xs, ys)]
+
+
+def test_stamp():
+    map_occupied = np.zeros((10, 8), dtype=bool)
+    grid = OccupancyGrid(map_occupied)
+    mask = np.ones((2, 3), dtype=bool)
+    grid.stamp(mask, 1, 2)
+    assert grid.map.sum() == 6
+    assert grid.map[1:3, 2:5].all()
+    assert not grid.check_fit(mask, 2, 3)
+    # the canvas map is copied, not modified
+    assert not map_occupied.any()
+
+
+def test_summed_area_table():
+    rng = np.random.default_rng(0)
+    map_occupied = rng.random((13, 7)) < 0.3
+    sat = calculate_summed_area_table(map_occupied)
+    assert sat.shape == (14, 8)
+    assert sat[13, 7] == map_occupied.sum()
+    assert sat[5, 3] == map_occupied[:5, :3].sum()
+    grid = OccupancyGrid(map_occupied)
+    assert grid.count_occupied(2, 1, 9, 6) == map_occupied[2:9, 1:6].sum()
+
+
+def test_check_fit_batch_with_blocks():
+    rng = np.random.default_rng(1)
+    map_occupied = rng.random((40, 30)) < 0.05
+    grid = OccupancyGrid(map_occupied)
+    mask = np.ones((8, 6), dtype=bool)
+    mask[0, 0] = mask[7, 5] = False
+    blocks = find_solid_blocks(mask, 4)
+    assert len(blocks) > 0
+    for (x0, y0, x1, y1) in blocks:
+        assert mask[x0:x1, y0:y1].all()
+
+    xs = rng.integers(-5, 40, 500)
+    ys = rng.integers(-5, 30, 500)
+    assert (grid.check_fit_batch(mask, xs, ys, blocks) == grid.check_fit_batch(mask, xs, ys)).all()
+    # the summed-area table follows stamping
+    grid.stamp(mask, 3, 4)
+    assert (grid.check_fit_batch(mask, xs, ys, blocks) == grid.check_fit_batch(mask, xs, ys)).all()
+
+
+def test_check_fit_batch_in_chunks(monkeypatch):
+    rng = np.random.default_rng(2)
+    grid = OccupancyGrid(rng.random((40, 30)) < 0.02)
+    mask = np.ones((5, 4), dtype=bool)
+    xs = rng.integers(-5, 40, 300)
+    ys = rng.integers(-5, 30, 300)
+    fit = grid.check_fit_batch(mask, xs, ys)
+    # a few windows at a time give the same result
+    monkeypatch.setattr(EmojiCloud.occupancy, 'FIT_TEST_BUDGET', 7 * mask.size)
+    assert (grid.check_fit_batch(mask, xs, ys) == fit).all()
+    assert fit.any() and not fit.all()
+
+
+def test_correlate():
+    rng = np.random.default_rng(2)
+    map_occupied = rng.random((25, 18)) < 0.1
+    grid = OccupancyGrid(map_occupied)
+    mask = rng.random((6, 4)) < 0.7
+    overlap = grid.correlate(mask)
+    assert overlap.shape == (20, 15)
+    for x in range(20):
+        for y in range(15):
+            assert overlap[x, y] == (map_occupied[x:x + 6, y:y + 4] & mask).sum()
+    # too large for the canvas
+    assert grid.correlate(np.ones((30, 2), dtype=bool)).size == 0
+
+
+def test_candidate_index():
+    grid = OccupancyGrid(np.zeros((6, 5), dtype=bool))
+    list_canvas_pix = [(x, y) for y in range(5) for x in range(6)]
+    candidates = CandidateIndex(list_canvas_pix, grid)
+    grid.stamp(np.ones((6, 2), dtype=bool), 0, 0)
+    grid.stamp(np.ones((1, 1), dtype=bool), 3, 2)
+
+    list_free = []
+    for xs, ys in candidates.iter_batches(batch_size=4):
+        list_free += list(zip(xs.tolist(), ys.tolist()))
+    assert list_free == [p for p in list_canvas_pix if not grid.map[p]]
+    # the occupied head of the list is skipped for good
+    assert candidates.start == 12
+
+
+def test_max_pool():
+    array = np.zeros((7, 5), dtype=bool)
+    array[4, 1] = True
+    assert max_pool(array, 3).tolist() == [[False, False], [True, False], [False, False]]
+    # the blocks at the end of each axis reach beyond the array
+    pooled = max_pool(array, 3, pad_value=True)
+    assert pooled.tolist() == [[False, True], [True, True], [True, True]]
+
+
+def test_coarse_fit_is_conservative():
+    rng = np.random.default_rng(3)
+    map_occupied = rng.random((41, 30)) < 0.02
+    grid = CoarseOccupancyGrid(map_occupied, factor=4)
+    assert grid.coarse.map.shape == (11, 8)
+    mask = rng.random((7, 5)) < 0.8
+    coarse_mask = coarsen_mask(mask, 4)
+    overlap = grid.coarse.correlate(coarse_mask)
+    for cell_x, cell_y in zip(*np.nonzero(overlap == 0)):
+        # the mask fits at every position inside a fitting coarse cell
+        for x in range(cell_x * 4, cell_x * 4 + 4):
+            for y in range(cell_y * 4, cell_y * 4 + 4):
+                assert grid.fine.check_fit(mask, x, y)
+
+
+def test_coarse_stamp():
+    grid = CoarseOccupancyGrid(np.zeros((20, 16), dtype=bool), factor=4)
+    grid.stamp(np.ones((2, 3), dtype=bool), 3, 7)
+    assert grid.fine.map.sum() == 6
+    assert (grid.coarse.map == max_pool(grid.fine.map, 4, pad_value=True)).all()
+    assert grid.coarse.count_occupied(0, 0, 5, 4) == 4
+
+
+def test_snapshot_rollback():
+    map_occupied = np.zeros((10, 8), dtype=bool)
+    map_occupied[0, 0] = True
+    grid = OccupancyGrid(map_occupied.copy())
+    grid.stamp(np.ones((2, 2), dtype=bool), 4, 4)
+    snapshot = grid.snapshot()
+    grid.stamp(np.ones((3, 3), dtype=bool), 1, 1)
+    inner = grid.snapshot()
+    grid.stamp(np.ones((2, 2), dtype=bool), 5, 5)
+    assert grid.count_occupied(0, 0, 10, 8) == 1 + 4 + 9 + 3
+
+    # only the stamps after a snapshot are undone, nested snapshots included
+    assert grid.rollback(inner) == [(5, 5, 7, 7)]
+    assert grid.count_occupied(0, 0, 10, 8) == 1 + 4 + 9
+    grid.rollback(snapshot)
+    expected = map_occupied.copy()
+    expected[4:6, 4:6] = True
+    assert (grid.map == expected).all()
+    assert grid.count_occupied(0, 0, 10, 8) == 5
+
+    coarse = CoarseOccupancyGrid(np.zeros((20, 16), dtype=bool), factor=4)
+    snapshot = coarse.snapshot()
+    coarse.stamp(np.ones((2, 3), dtype=bool), 3, 7)
+    coarse.rollback(snapshot)
+    assert not coarse.fine.map.any()
+    assert (coarse.coarse.map == max_pool(coarse.fine.map, 4, pad_value=True)).all()
@@ -1,8 +1,11 @@
+import numpy as np
 from EmojiCloud.util import *
-from EmojiCloud.plot import plot_dense_emoji_cloud
-from EmojiCloud.emoji import EmojiManager
+from EmojiCloud.plot import plot_dense_emoji_cloud, find_position_by_scan, find_position_by_correlation, find_position_by_coarse_search, create_placement_plan, composite_sprites, get_placement_strategy, make_result_key, SpiralPlacement
+from EmojiCloud.sprite import prepare_sprite
+from EmojiCloud.emoji import EmojiManager, EmojiItem
 from EmojiCloud.canvas import EllipseCanvas, RectangleCanvas, MaskedCanvas
-from EmojiCloud.vendors import GOOGLE, vendor_dir_list
+from EmojiCloud.occupancy import OccupancyGrid, CoarseOccupancyGrid, CandidateIndex
+from EmojiCloud.vendors import GOOGLE
 
 
 # def test_plot():
@@ -18,4 +21,128 @@ from EmojiCloud.vendors import GOOGLE, vendor_dir_list
 
 
 def test_plot():
-    pass
\ No newline at end of file
+    pass
+
+
+def test_placement_modes_agree():
+    canvas = EllipseCanvas(60, 40)
+    list_canvas_pix = canvas.calculate_sorted_canvas_pix_for_plotting()
+    grid = OccupancyGrid(canvas.map_occupied)
+    candidates = CandidateIndex(list_canvas_pix, grid)
+    mask = np.ones((7, 5), dtype=bool)
+    mask[3, 2] = False
+    for i in range(12):
+        position = find_position_by_scan(grid, mask, -3, -2, candidates)
+        assert position == find_position_by_correlation(grid, mask, -3, -2, canvas.center_x, canvas.center_y)
+        if (position is None):
+            break
+        grid.stamp(mask, position[0] - 3, position[1] - 2)
+
+
+def test_coarse_placement():
+    canvas = EllipseCanvas(60, 40)
+    list_canvas_pix = canvas.calculate_sorted_canvas_pix_for_plotting()
+    grid = CoarseOccupancyGrid(canvas.map_occupied, factor=3)
+    candidates = CandidateIndex(list_canvas_pix, grid.fine)
+    mask = np.ones((7, 5), dtype=bool)
+    count = 0
+    while (True):
+        position = find_position_by_coarse_search(grid, mask, -3, -2, canvas.center_x, canvas.center_y, candidates)
+        if (position is None):
+            break
+        x, y = position
+        assert not grid.fine.map[x, y]
+        assert grid.fine.check_fit(mask, x - 3, y - 2)
+        grid.stamp(mask, x - 3, y - 2)
+        count += 1
+    # the full-resolution scan places the emoji wherever it fits
+    assert count > 0
+    assert find_position_by_correlation(grid.fine, mask, -3, -2, canvas.center_x, canvas.center_y) is None
+    # the first emoji is placed as close to the center as by the exact search
+    assert grid.fine.map[canvas.center_x, canvas.center_y]
+
+
+def test_spiral_placement():
+    canvas = RectangleCanvas(60, 40)
+    strategy = SpiralPlacement(angular_step=0.2)
+    grid = strategy.create_grid(canvas)
+    sprite = prepare_sprite(Image.new('RGBA', (7, 5), (255, 0, 0, 255)), 4)
+    count = 0
+    while (True):
+        position = strategy.find_position(grid, sprite, canvas, None)
+        if (position is None):
+            break
+        x, y = position
+        assert grid.check_fit(sprite.mask, x + sprite.offset_x, y + sprite.offset_y)
+        grid.stamp(sprite.mask, x + sprite.offset_x, y + sprite.offset_y)
+        count += 1
+    # the first emoji is placed at the center and the spiral reaches the canvas corners
+    assert grid.map[canvas.center_x, canvas.center_y]
+    assert grid.map[:10, :10].any() and grid.map[-10:, -10:].any()
+    assert count > 30
+
+    emoji_list = []
+    for i in range(6):
+        emoji_list.append(EmojiItem.from_image('1f60%d' % i, 1 + i, GOOGLE, Image.new('RGBA', (72, 72), (40 * i, 0, 0, 255))))
+    im = plot_dense_emoji_cloud(canvas, emoji_list, placement='spiral')
+    assert im.tobytes() == plot_dense_emoji_cloud(canvas, emoji_list, placement=SpiralPlacement()).tobytes()
+    # a name and its strategy share cached results
+    assert make_result_key('image', canvas, emoji_list, 4, 20, 0.1, 'spiral', 'linear', None) == \
+        make_result_key('image', canvas, emoji_list, 4, 20, 0.1, SpiralPlacement(), 'linear', None)
+    assert make_result_key('image', canvas, emoji_list, 4, 20, 0.1, 'spiral', 'linear', None) != \
+        make_result_key('image', canvas, emoji_list, 4, 20, 0.1, strategy, 'linear', None)
+    try:
+        get_placement_strategy('nowhere')
+        assert False
+    except ValueError:
+        pass
+
+
+def test_placement_plan():
+    emoji_list = []
+    for i, weight in enumerate([1, 3, 2]):
+        emoji_list.append(EmojiItem.from_image('1f60%d' % i, weight, GOOGLE, Image.new('RGBA', (72, 72), (255, 0, 0, 255))))
+    plan = create_placement_plan(emoji_list, 72 * 72 * 4)
+    assert plan.weights == (0.5, 2 / 6, 1 / 6)
+    assert plan.images[0] is emoji_list[1].image
+    # the emoji items are not modified
+    assert [e.weight for e in emoji_list] == [1, 3, 2]
+    size_1 = [im.size for im in plan.resize(1)]
+    size_2 = [im.size for im in plan.resize(2)]
+    assert size_1[0][0] > size_1[1][0] > size_1[2][0]
+    assert all(s_2[0] < s_1[0] for s_1, s_2 in zip(size_1, size_2))
+
+
+def test_parallel_search():
+    canvas = EllipseCanvas(120, 120)
+    images = []
+    for search in ['linear', 'parallel']:
+        emoji_list = []
+        for i in range(12):
+            emoji_list.append(EmojiItem.from_image('1f60%d' % i, 1 / (1 + i % 4), GOOGLE, Image.new('RGBA', (72, 72), (20 * i, 0, 0, 255))))
+        images.append(plot_dense_emoji_cloud(canvas, emoji_list, search=search, num_worker=2))
+    assert images[0].tobytes() == images[1].tobytes()
+
+
+def test_composite_sprites():
+    im = Image.new('RGBA', (30, 20), (0, 0, 0, 0))
+    im.paste((255, 0, 0, 255), (5, 4, 25, 16))
+    im.putpixel((3, 3), (0, 255, 0, 100))
+    sprite = prepare_sprite(im, 4)
+    canvas_img = Image.new('RGBA', (50, 40), 'white')
+
+    img = composite_sprites(canvas_img, [(sprite, 20, 15), (sprite, 30, 25)])
+    # the same as drawing each opaque pixel
+    img_expected = canvas_img.copy()
+    for x, y in [(20, 15), (30, 25)]:
+        for dx, dy, color in zip(sprite.pix_x.tolist(), sprite.pix_y.tolist(), sprite.colors.tolist()):
+            img_expected.putpixel((x + dx, y + dy), tuple(color))
+    assert img.tobytes() == img_expected.tobytes()
+    assert canvas_img.getpixel((20, 15)) == (255, 255, 255, 255)
+
+    # blending the faint pixel over the white canvas
+    img_blend = composite_sprites(canvas_img, [(sprite, 20, 15)], blend=True)
+    x, y = 20 + sprite.offset_x, 15 + sprite.offset_y
+    assert img.getpixel((x, y)) == (0, 255, 0, 100)
+    assert img_blend.getpixel((x, y)) == (155, 255, 155, 255)
+    assert img_blend.getpixel((20, 15)) == (255, 0, 0, 255)
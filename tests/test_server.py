@@ -0,0 +1,65 @@
+import io
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import EmojiCloud.emoji
+from EmojiCloud.availability import VendorIndex
+from EmojiCloud.benchmark import make_synthetic_sprite
+from EmojiCloud.server import RenderServer, LocalClient
+
+
+def make_request(count, width=80):
+    return {
+        "weights": {'%04x' % i: i + 1 for i in range(count)}, "vendor": "Synthetic",
+        "canvas": {"shape": "rectangle", "width": width, "height": 60}
+    }
+
+
+def test_render_server(tmp_path, monkeypatch):
+    (tmp_path / 'Synthetic').mkdir()
+    for i in range(5):
+        make_synthetic_sprite(i).save(tmp_path / 'Synthetic' / ('U+%04X.png' % i))
+    monkeypatch.setattr(EmojiCloud.emoji, 'data_dir', str(tmp_path))
+    monkeypatch.setattr(EmojiCloud.emoji, 'vendor_index', VendorIndex(str(tmp_path)))
+
+    async def run():
+        with ThreadPoolExecutor(2) as executor:
+            server = RenderServer(executor, max_concurrency=1, max_queue=2)
+            client = LocalClient(server)
+
+            # identical requests in flight share one render
+            results = await asyncio.gather(*(client.render(make_request(5)) for _ in range(3)))
+            assert [status for status, _ in results] == [200] * 3
+            assert Image.open(io.BytesIO(results[0][1])).size == (80, 60)
+            assert server.stats()["counters"]["coalesced"] == 2
+            assert server.stats()["spans"]["render"]["count"] == 1
+
+            # distinct requests beyond the queue are rejected
+            results = await asyncio.gather(*(client.render(make_request(3, 60 + i)) for i in range(3)))
+            assert sorted(status for status, _ in results) == [200, 200, 503]
+            assert server.queue_depth == 0
+
+            # cancelling the first client of a shared render does not cancel the others
+            first = asyncio.ensure_future(client.render(make_request(4)))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(client.render(make_request(4)))
+            await asyncio.sleep(0)
+            first.cancel()
+            status, png = await second
+            assert first.cancelled()
+            assert status == 200 and Image.open(io.BytesIO(png)).size == (80, 60)
+            assert server.queue_depth == 0
+
+            assert (await client.render({"weights": {"ffff": 1}, "vendor": "Synthetic"}))[0] == 422
+            assert (await client.request('POST', '/render', b'{'))[0] == 400
+            assert (await client.request('GET', '/render'))[0] == 405
+
+            report = await client.load_test([make_request(2, 60 + i % 4) for i in range(12)], concurrency=4)
+            assert sum(report["statuses"].values()) == 12
+            status, content_type, body = await client.request('GET', '/metrics')
+            stats = json.loads(body)
+            assert stats["counters"]["requests"] == 3 + 3 + 2 + 1 + 12
+            assert stats["latency"]["p50"] <= stats["latency"]["p99"]
+
+    asyncio.run(run())
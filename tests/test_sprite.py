@@ -0,0 +1,50 @@
+import numpy as np
+from PIL import Image, ImageDraw
+from EmojiCloud.sprite import prepare_sprite
+from EmojiCloud.util import remove_pixel_outside_bb, parse_image_by_array
+
+
+def create_image():
+    im = Image.new('RGBA', (40, 30), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+    draw.ellipse([3, 4, 18, 25], fill=(255, 0, 0, 255))
+    # an empty column between two parts
+    draw.rectangle([22, 10, 35, 20], fill=(0, 255, 0, 200))
+    # faint pixels below the threshold
+    im.putpixel((1, 1), (0, 0, 255, 2))
+    im.putpixel((20, 5), (0, 0, 255, 3))
+    return im
+
+
+def test_prepare_sprite():
+    im = create_image()
+    sprite = prepare_sprite(im, 4)
+
+    dict_opacity = parse_image_by_array(remove_pixel_outside_bb(im, 4))
+    list_x = [x for (x, y) in dict_opacity]
+    list_y = [y for (x, y) in dict_opacity]
+    img_center_x = int(sum(list_x) / len(list_x))
+    img_center_y = int(sum(list_y) / len(list_y))
+
+    assert sprite.area == len(dict_opacity)
+    assert sprite.mask.sum() == len(dict_opacity)
+    assert sprite.offset_x == min(list_x) - img_center_x
+    assert sprite.offset_y == min(list_y) - img_center_y
+    dict_sprite = {
+        (x + img_center_x, y + img_center_y): tuple(color)
+        for x, y, color in zip(sprite.pix_x.tolist(), sprite.pix_y.tolist(), sprite.colors.tolist())
+    }
+    assert dict_sprite == dict_opacity
+    # farthest first
+    dist = sprite.pix_x.astype(int) ** 2 + sprite.pix_y.astype(int) ** 2
+    assert (np.diff(dist) <= 0).all()
+
+
+def test_remove_pixel_outside_bb():
+    im = create_image()
+    im_dense = remove_pixel_outside_bb(im, 4)
+    # the columns of x in [3, 18] and [22, 35] and the rows of y in [4, 25] have an alpha of at least 4
+    im_array = np.asarray(im)
+    im_expected = np.concatenate([im_array[4:26, 3:19], im_array[4:26, 22:36]], axis=1)
+    assert im_dense.size == (30, 22)
+    assert np.array_equal(np.asarray(im_dense), im_expected)